@@ -0,0 +1,108 @@
+"""
+Token-aware map-reduce condensing for inputs that are too long for one prompt.
+
+Long inputs are split into overlapping chunks on line boundaries, each chunk
+is condensed by the LLM concurrently (the map step), and the joined notes
+replace the original text in the final prompt (the reduce step).
+"""
+import asyncio
+import logging
+from functools import lru_cache
+from typing import Callable, List
+from constants import CHUNKING_CONFIG
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=None)
+def _get_encoding():
+    # Loaded on first use: building the encoding reads (or downloads) its BPE ranks
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:  # tiktoken is optional; fall back to a character heuristic
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def split_long_line(line: str, max_tokens: int) -> List[str]:
+    """Hard-split a line longer than `max_tokens` (e.g. from a PDF without line breaks)."""
+    pieces = []
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    while estimate_tokens(line) > max_tokens:
+        piece = line[:max_chars]
+        # Token-dense text (numbers, non-Latin scripts) needs shorter pieces
+        while len(piece) > 1 and estimate_tokens(piece) > max_tokens:
+            piece = piece[:len(piece) * max_tokens // estimate_tokens(piece)]
+        pieces.append(piece)
+        line = line[len(piece):]
+    pieces.append(line)
+    return pieces
+
+
+def split_text(text: str, chunk_tokens: int, overlap_tokens: int = 0) -> List[str]:
+    """Split text into chunks of about `chunk_tokens`, breaking on lines and overlapping by `overlap_tokens`."""
+    lines = [piece for line in text.splitlines() for piece in split_long_line(line, chunk_tokens)]
+
+    chunks = []
+    current, current_tokens = [], 0
+    for line in lines:
+        tokens = estimate_tokens(line) + 1
+        if current and current_tokens + tokens > chunk_tokens:
+            chunks.append("\n".join(current))
+            # Carry trailing lines into the next chunk for context
+            overlap, overlap_size = [], 0
+            for prev in reversed(current):
+                overlap_size += estimate_tokens(prev) + 1
+                if overlap_size > overlap_tokens:
+                    break
+                overlap.insert(0, prev)
+            current, current_tokens = overlap, sum(estimate_tokens(l) + 1 for l in overlap)
+        current.append(line)
+        current_tokens += tokens
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def input_budget(llm, default_tokens: int, template: str = "") -> int:
+    """Tokens of text that fit in one prompt to `llm` alongside `template`.
+
+    That is `default_tokens`, capped for clients with a small input limit
+    (their `max_input_tokens`, e.g. a local model's context size).
+    """
+    limit = getattr(llm, "max_input_tokens", None)
+    if not limit:
+        return default_tokens
+    room = int(limit * CHUNKING_CONFIG["model_limit_margin"]) - estimate_tokens(template)
+    return max(min(default_tokens, room), 1)
+
+
+async def condense(llm, text: str, build_map_prompt: Callable[[str, int, int], str], max_tokens: int = None) -> str:
+    """Return `text` unchanged if it fits in `max_tokens`, otherwise map-reduce it into condensed notes.
+
+    `build_map_prompt(chunk, index, total)` builds the prompt that condenses one chunk.
+    """
+    config = CHUNKING_CONFIG
+    max_tokens = max_tokens or config["max_input_tokens"]
+    # Each map prompt has to fit the client's input limit too
+    chunk_tokens = input_budget(llm, config["chunk_tokens"], build_map_prompt("", 1, 1))
+    overlap_tokens = min(config["overlap_tokens"], chunk_tokens // 4)
+    rounds = 0
+    while estimate_tokens(text) > max_tokens and rounds < config["max_rounds"]:
+        chunks = split_text(text, chunk_tokens, overlap_tokens)
+        logger.info(f"Condensing ~{estimate_tokens(text)} tokens in {len(chunks)} chunks (round {rounds + 1})")
+        notes = await asyncio.gather(*(
+            llm.ainvoke(build_map_prompt(chunk, i + 1, len(chunks))) for i, chunk in enumerate(chunks)
+        ))
+        text = "\n\n".join(f"[Part {i + 1}/{len(notes)}]\n{note.strip()}" for i, note in enumerate(notes))
+        rounds += 1
+    return text
@@ -1,6 +1,19 @@
 import os
 from dotenv import load_dotenv
-from constants import LLM_CONFIG, AUDIO_CONFIG, CASTINGFIT_CONFIG
+from constants import LLM_CONFIG, AUDIO_CONFIG, CASTINGFIT_CONFIG, API_ENDPOINTS
+
+# Environment variables that override the upstream URLs in API_ENDPOINTS
+ENDPOINT_ENV_VARS = {
+    "speech_to_text": "VAPI_SPEECH_TO_TEXT_URL",
+    "text_to_speech": "VAPI_TEXT_TO_SPEECH_URL",
+    "call_feedback": "VAPI_CALL_FEEDBACK_URL",
+    "tavily_search": "TAVILY_SEARCH_URL",
+}
+
+def get_endpoint(name: str) -> str:
+    """Upstream URL for `name`, from its environment variable or the API_ENDPOINTS default."""
+    load_dotenv()
+    return os.getenv(ENDPOINT_ENV_VARS[name]) or API_ENDPOINTS[name]
 
 class Config:
     def __init__(self):
@@ -13,10 +13,24 @@ LLM_CONFIG = {
     "task": "text-generation"
 }
 
+# Local model serving (LLM_PROVIDER=huggingface): concurrent prompts are micro-batched
+LOCAL_LLM_CONFIG = {
+    "max_batch_size": 8,
+    "max_wait_ms": 20,
+    "max_input_tokens": 512
+}
+
 # Audio Configuration
 AUDIO_CONFIG = {
     "sample_rate": 16000,
-    "channels": 1
+    "channels": 1,
+    # Speech-to-text uploads are streamed in chunks and converted to the format above before forwarding
+    "upload_chunk_bytes": 64 * 1024,
+    "max_upload_bytes": 25 * 1024 * 1024,
+    "max_concurrent_conversions": 4,
+    "conversion_timeout_seconds": 60,
+    # Output for compressed inputs (WebM/Ogg/MP4) converted with ffmpeg
+    "ffmpeg_output_format": "flac"
 }
 
 # CastingFit Configuration
@@ -25,9 +39,154 @@ CASTINGFIT_CONFIG = {
     "duration_minutes": 10
 }
 
+# Synthesized speech is cached by text; any prewarm_phrases are synthesized at startup
+TTS_CONFIG = {
+    "cache_control_max_age": 24 * 3600,
+    "prewarm_concurrency": 2,
+    # Text synthesized often enough to be worth paying for at startup. Only list text that is actually
+    # sent to /api/text-to-speech: VAPI speaks the call's greeting itself, and the frontend has no fixed prompts
+    "prewarm_phrases": []
+}
+
+# Call feedback polling (VAPI call status checks run in a background job)
+FEEDBACK_POLL_CONFIG = {
+    "initial_delay_seconds": 2,
+    "max_delay_seconds": 30,
+    "backoff_multiplier": 2,
+    "max_wait_seconds": 900,
+    "empty_transcript_retries": 3,
+    "job_ttl_seconds": 3600
+}
+
+# VAPI end-of-call webhooks: events are queued and feedback is precomputed by background workers
+WEBHOOK_CONFIG = {
+    "queue_size": 1000,
+    "workers": 4
+}
+
+# PDF extraction (runs in the worker process pool)
+PDF_CONFIG = {
+    "max_bytes": 10 * 1024 * 1024,
+    "max_pages": 50,
+    "timeout_seconds": 30,
+    "parallel_page_threshold": 8,
+    "pages_per_task": 4
+}
+
+# Process pool for CPU-heavy work; None means one worker per CPU core
+WORKER_CONFIG = {
+    "process_pool_size": None
+}
+
+# Background warm-up after startup: heavy libraries are imported lazily, so they are loaded here
+# (in the API process, and in the process pool's workers) before the worker reports ready
+STARTUP_CONFIG = {
+    "preload_modules": ("httpx", "openai", "numpy"),
+    "pool_preload_modules": ("pdfplumber",),
+    "warm_process_pool": True,
+    # Until a warm-up succeeds the worker reports not ready, and warm-up is retried this often
+    "warm_up_retry_seconds": 5
+}
+
+# Map-reduce chunking for long transcripts (sizes in estimated tokens); CVs are cut down by RELEVANCE_CONFIG instead
+CHUNKING_CONFIG = {
+    "max_input_tokens": 6000,
+    "chunk_tokens": 2500,
+    "overlap_tokens": 100,
+    "max_rounds": 3,
+    # Share of a client's own input limit (e.g. a local model's) that prompts are sized to;
+    # sizes here are estimated tokens, and the model's tokenizer may count more
+    "model_limit_margin": 0.8
+}
+
+# Local relevance pre-filter: only the CV blocks that best match the requirements go into the prompt
+RELEVANCE_CONFIG = {
+    "max_prompt_tokens": 2500,
+    "max_block_tokens": 300,
+    "phrase_weight": 1.5,
+    "bm25_k1": 1.2,
+    "bm25_b": 0.75
+}
+
+# Batch candidate screening
+BATCH_CONFIG = {
+    "max_candidates": 200,
+    # Uncompressed PDF bytes across the whole batch, zip members included
+    "max_total_bytes": 200 * 1024 * 1024,
+    "max_concurrency": 8,
+    "job_ttl_seconds": 6 * 3600
+}
+
+# Result caches: an in-process LRU tier backed by a local SQLite tier
+CACHE_CONFIG = {
+    "profile_results": {
+        "memory_entries": 256,
+        "ttl_seconds": 7 * 24 * 3600,
+        "disk_max_bytes": 100 * 1024 * 1024
+    },
+    "tavily_context": {
+        "max_entries": 512,
+        "ttl_seconds": 6 * 3600
+    },
+    "tts_audio": {
+        "memory_entries": 64,
+        "ttl_seconds": 30 * 24 * 3600,
+        "disk_max_bytes": 200 * 1024 * 1024
+    }
+}
+
+# Pooled async HTTP clients, one per upstream
+HTTP_CLIENT_CONFIG = {
+    "vapi": {
+        "timeout_seconds": 30,
+        "connect_timeout_seconds": 5,
+        "max_connections": 100,
+        "max_keepalive_connections": 20,
+        "retries": 2
+    },
+    "tavily": {
+        "timeout_seconds": 10,
+        "connect_timeout_seconds": 5,
+        "max_connections": 50,
+        "max_keepalive_connections": 10,
+        "retries": 1
+    }
+}
+
+# Per-client limits are counted in memory and merged into the shared store this often, so workers
+# see each other's hits with up to this much lag
+RATE_LIMIT_STORAGE_CONFIG = {
+    "sync_interval_seconds": 1.0,
+    "purge_interval_seconds": 60
+}
+
+# Per-upstream token buckets shared by all workers: calls queue up to max_queue_seconds for a slot,
+# beyond that they are shed with 503 + Retry-After. A 429 without Retry-After pauses for default_backoff_seconds.
+UPSTREAM_RATE_LIMITS = {
+    "vapi": {
+        "rate_per_second": 10,
+        "burst": 20,
+        "max_queue_seconds": 10,
+        "default_backoff_seconds": 2
+    },
+    "tavily": {
+        "rate_per_second": 5,
+        "burst": 10,
+        "max_queue_seconds": 5,
+        "default_backoff_seconds": 2
+    },
+    "openai": {
+        "rate_per_second": 8,
+        "burst": 16,
+        "max_queue_seconds": 30,
+        "default_backoff_seconds": 5
+    }
+}
+
 # API Endpoints
 API_ENDPOINTS = {
     "speech_to_text": "https://api.vapi.ai/v1/speech-to-text",
     "text_to_speech": "https://api.vapi.ai/v1/text-to-speech",
-    "call_feedback": "https://api.vapi.ai/call"
+    "call_feedback": "https://api.vapi.ai/call",
+    "tavily_search": "https://api.tavily.com/search"
 } 
\ No newline at end of file
@@ -0,0 +1,93 @@
+"""
+Shared async HTTP clients for upstream APIs (VAPI, Tavily).
+
+Each upstream gets one keep-alive connection pool with its own timeouts,
+connection limits and bounded retries, and every attempt waits for a slot
+from the upstream's shared rate limiter. The pools are opened and closed by the
+FastAPI app lifespan.
+"""
+import asyncio
+import logging
+from typing import Dict
+from constants import HTTP_CLIENT_CONFIG
+from lazy import lazy_import
+from metrics import record_upstream_error
+from rate_limits import get_upstream_limiter
+
+logger = logging.getLogger(__name__)
+
+httpx = lazy_import("httpx")
+
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+RETRY_EXCEPTION_NAMES = ("ConnectError", "ConnectTimeout", "RemoteProtocolError")
+RETRY_BACKOFF_SECONDS = 0.5
+
+
+class UpstreamClient:
+    def __init__(self, name: str, settings: dict):
+        self.name = name
+        self.retries = settings["retries"]
+        self.retry_exceptions = tuple(getattr(httpx, name) for name in RETRY_EXCEPTION_NAMES)
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings["timeout_seconds"], connect=settings["connect_timeout_seconds"]),
+            limits=httpx.Limits(
+                max_connections=settings["max_connections"],
+                max_keepalive_connections=settings["max_keepalive_connections"],
+            ),
+        )
+
+    async def request(self, method: str, url: str, **kwargs) -> "httpx.Response":
+        """Send a request, retrying connection errors and transient upstream statuses."""
+        limiter = get_upstream_limiter()
+        attempt = 0
+        while True:
+            await limiter.acquire(self.name)
+            try:
+                response = await self.client.request(method, url, **kwargs)
+                if response.status_code >= 400:
+                    record_upstream_error(self.name, str(response.status_code))
+                if response.status_code == 429:
+                    await limiter.backoff(self.name, response.headers.get("Retry-After"))
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= self.retries:
+                    return response
+                logger.warning(f"{self.name} returned {response.status_code} for {method} {url}, retrying")
+            except httpx.HTTPError as e:
+                record_upstream_error(self.name, type(e).__name__)
+                if not isinstance(e, self.retry_exceptions) or attempt >= self.retries:
+                    raise
+                logger.warning(f"{self.name} connection error for {method} {url}: {e}, retrying")
+            attempt += 1
+            await asyncio.sleep(RETRY_BACKOFF_SECONDS * (2 ** (attempt - 1)))
+
+    async def get(self, url: str, **kwargs) -> "httpx.Response":
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> "httpx.Response":
+        return await self.request("POST", url, **kwargs)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+_clients: Dict[str, UpstreamClient] = {}
+
+
+def get_http_client(upstream: str) -> UpstreamClient:
+    """Return the pooled client for an upstream, creating it on first use."""
+    client = _clients.get(upstream)
+    if client is None:
+        if upstream not in HTTP_CLIENT_CONFIG:
+            raise ValueError(f"Unknown upstream: {upstream}")
+        client = _clients[upstream] = UpstreamClient(upstream, HTTP_CLIENT_CONFIG[upstream])
+    return client
+
+
+async def startup():
+    for upstream in HTTP_CLIENT_CONFIG:
+        get_http_client(upstream)
+
+
+async def shutdown():
+    clients = list(_clients.values())
+    _clients.clear()
+    await asyncio.gather(*(client.aclose() for client in clients), return_exceptions=True)
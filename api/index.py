@@ -1,20 +1,39 @@
+import time
+# Measured from here: the budget in bench/startup_budget.py covers import and warm-up time
+STARTED_AT = time.perf_counter()
+
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Optional
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+from typing import List, Optional
 from pydantic import BaseModel, Field
 import os
 import logging
 import sys
 from modules.ai_castingfit.castingfit_service import CastingFitService
+from modules.ai_castingfit.webhooks import SECRET_HEADER, FeedbackPrecomputer, parse_call_event, verify_secret
 from modules.profile_cast_aid.profile_service import ProfileService
+from modules.profile_cast_aid.batch_service import BatchScreeningService
 from config import Config
+from constants import STARTUP_CONFIG, TTS_CONFIG
+import http_client
+import lazy
+import workers
+import llm_providers
+import metrics
+import rate_limits
+from sse import sse_response
+from jobs import JOB_FAILED, JOB_SUCCEEDED
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 
 # Setup logging
+# LOG_LEVEL=DEBUG also logs full upstream payloads
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[
         logging.StreamHandler(sys.stdout)
@@ -22,8 +41,77 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Load configuration
+config = Config()
+VAPI_API_KEY = os.getenv("VAPI_BE_API_KEY")
+TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
+
+# Services are built in the lifespan, so importing the app stays cheap
+CastingFit_service: Optional[CastingFitService] = None
+profile_service: Optional[ProfileService] = None
+batch_service: Optional[BatchScreeningService] = None
+feedback_precomputer: Optional[FeedbackPrecomputer] = None
+
+def build_services():
+    global CastingFit_service, profile_service, batch_service, feedback_precomputer
+    CastingFit_service = CastingFitService(VAPI_API_KEY)
+    profile_service = ProfileService(TAVILY_API_KEY)
+    batch_service = BatchScreeningService(profile_service)
+    feedback_precomputer = FeedbackPrecomputer(CastingFit_service)
+
+async def _warm_up_once():
+    await asyncio.to_thread(lazy.preload, STARTUP_CONFIG["preload_modules"])
+    await http_client.startup()
+    try:
+        llm_providers.get_llm_client()
+    except Exception as e:
+        # Requests will surface the configuration error; readiness does not depend on it
+        logger.warning(f"LLM client not available: {str(e)}")
+    if STARTUP_CONFIG["warm_process_pool"]:
+        await workers.warm_up(STARTUP_CONFIG["pool_preload_modules"])
+
+async def warm_up(app: FastAPI):
+    """Load deferred dependencies and upstream clients in the background, then report ready.
+
+    A failed warm-up is reported by /api/ready and retried until it succeeds.
+    """
+    while True:
+        try:
+            await _warm_up_once()
+            break
+        except Exception as e:
+            app.state.warm_up_error = f"{type(e).__name__}: {e}"
+            logger.error(f"Warm-up failed, retrying in {STARTUP_CONFIG['warm_up_retry_seconds']}s: {str(e)}")
+            await asyncio.sleep(STARTUP_CONFIG["warm_up_retry_seconds"])
+    app.state.warm_up_error = None
+    app.state.ready = True
+    elapsed = time.perf_counter() - STARTED_AT
+    metrics.startup_seconds.set(elapsed, phase="ready")
+    logger.info(f"Worker ready {elapsed:.2f}s after start")
+    # Warm the TTS cache afterwards so readiness is not held up by VAPI
+    await CastingFit_service.prewarm_tts()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.ready = False
+    app.state.warm_up_error = None
+    build_services()
+    lag_monitor = asyncio.create_task(metrics.monitor_event_loop_lag())
+    warm = asyncio.create_task(warm_up(app))
+    feedback_precomputer.start()
+    metrics.startup_seconds.set(time.perf_counter() - STARTED_AT, phase="serving")
+    yield
+    lag_monitor.cancel()
+    warm.cancel()
+    await feedback_precomputer.shutdown()
+    await CastingFit_service.feedback_jobs.shutdown()
+    await batch_service.jobs.shutdown()
+    await http_client.shutdown()
+    await llm_providers.shutdown()
+    workers.shutdown()
+
 # Initialize FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -34,19 +122,48 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Load configuration
-config = Config()
-VAPI_API_KEY = os.getenv("VAPI_BE_API_KEY")
-TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
-
-# Initialize services
-CastingFit_service = CastingFitService(VAPI_API_KEY)
-profile_service = ProfileService(TAVILY_API_KEY)
+@app.middleware("http")
+async def request_timing(request: Request, call_next):
+    """Record request latency and report per-stage timings in the Server-Timing header."""
+    timings = metrics.start_request_timing()
+    metrics.requests_in_flight.inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["Server-Timing"] = metrics.server_timing_header(timings, time.perf_counter() - start)
+        return response
+    finally:
+        metrics.requests_in_flight.dec()
+        route = request.scope.get("route")
+        metrics.request_latency.observe(
+            time.perf_counter() - start,
+            route=route.path if route else "unmatched", method=request.method, status=status,
+        )
 
 # Initialize rate limiter
-limiter = Limiter(key_func=get_remote_address)
+# Counters live in shared storage (SQLite by default) so limits hold across uvicorn workers
+# RATE_LIMIT_ENABLED=false disables limits, e.g. for load tests
+limiter = Limiter(
+    key_func=get_remote_address,
+    storage_uri=rate_limits.storage_uri(),
+    enabled=os.getenv("RATE_LIMIT_ENABLED", "true").lower() != "false",
+)
 app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+
+def rate_limit_exceeded(request: Request, exc: RateLimitExceeded):
+    """429 with a Retry-After for when the client's current window resets."""
+    response = _rate_limit_exceeded_handler(request, exc)
+    try:
+        limit, args = request.state.view_rate_limit
+        reset_at, _ = limiter.limiter.get_window_stats(limit, *args)
+        response.headers["Retry-After"] = str(max(1, int(reset_at - time.time()) + 1))
+    except Exception as e:
+        logger.warning(f"Could not compute Retry-After: {e}")
+    return response
+
+app.add_exception_handler(RateLimitExceeded, rate_limit_exceeded)
 
 # Input validation models
 class ProfileRequest(BaseModel):
@@ -62,16 +179,55 @@ async def parse_profile(request: Request, requirements: str = Form(...), file: U
     """Parse and analyze a candidate's profile."""
     try:
         return await profile_service.parse_profile(requirements, file)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in parse_profile: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/parse-profile/stream")
+@limiter.limit("10/minute")
+async def parse_profile_stream(request: Request, requirements: str = Form(...), file: UploadFile = File(...)):
+    """Parse and analyze a candidate's profile, streaming the analysis as server-sent events."""
+    contents = await profile_service.read_pdf_upload(file)
+    return sse_response(profile_service.stream_analysis(requirements, contents))
+
+@app.post("/api/parse-profile/batch")
+@limiter.limit("2/minute")
+async def parse_profile_batch(request: Request, requirements: str = Form(...), files: List[UploadFile] = File(...)):
+    """Screen many candidate PDFs (or zip archives of PDFs) against one set of requirements.
+
+    Streams each candidate's result as a server-sent event as soon as it finishes. The first
+    event carries the job id, which can be used to resume via /api/parse-profile/batch/{job_id}.
+    """
+    candidates = await batch_service.read_uploads(files)
+    job = batch_service.start(requirements, candidates)
+    return sse_response(batch_service.stream(job))
+
+@app.get("/api/parse-profile/batch/{job_id}")
+async def parse_profile_batch_status(job_id: str):
+    """Get the status and finished candidate results of a batch job."""
+    job = batch_service.jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Batch job not found.")
+    return batch_service.describe(job)
+
+@app.get("/api/parse-profile/batch/{job_id}/stream")
+async def parse_profile_batch_stream(job_id: str, start: int = Query(0, ge=0)):
+    """Resume a batch stream, replaying candidate results from index `start`."""
+    job = batch_service.jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Batch job not found.")
+    return sse_response(batch_service.stream(job, start))
+
 @app.post("/api/speech-to-text")
 @limiter.limit("30/minute")
 async def speech_to_text_vapi(request: Request, file: UploadFile = File(...)):
     """Convert speech to text using VAPI."""
     try:
         return await CastingFit_service.speech_to_text(file)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in speech_to_text: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -79,27 +235,117 @@ async def speech_to_text_vapi(request: Request, file: UploadFile = File(...)):
 @app.post("/api/text-to-speech")
 @limiter.limit("30/minute")
 async def text_to_speech_vapi(request: Request, text_request: TextToSpeechRequest):
-    """Convert text to speech using VAPI."""
+    """Convert text to speech using VAPI; clients holding the audio can revalidate with If-None-Match."""
     try:
-        return await CastingFit_service.text_to_speech(text_request.text)
+        etag = f'"{CastingFit_service.tts_key(text_request.text)}"'
+        headers = {"ETag": etag, "Cache-Control": f"private, max-age={TTS_CONFIG['cache_control_max_age']}"}
+        if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+            return Response(status_code=304, headers=headers)
+        result = await CastingFit_service.text_to_speech(text_request.text)
+        return JSONResponse(content=result, headers=headers)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in text_to_speech: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _feedback_job_response(job):
+    """Finished jobs return their result; pending ones return 202 with a status link."""
+    if job.done:
+        # Results that were not stored (e.g. no transcript yet) and failures are surfaced once;
+        # the next request for this call starts a fresh job
+        CastingFit_service.settle_feedback_job(job)
+    if job.status == JOB_SUCCEEDED:
+        return job.result
+    if job.status == JOB_FAILED:
+        # Keeps the job's own status, e.g. 504 for a polling timeout or 503 + Retry-After when shed
+        raise HTTPException(status_code=job.error_status or 500, headers=job.error_headers,
+                            detail=job.error or "Failed to generate call feedback summary.")
+    body = job.to_dict()
+    body["processing"] = True
+    status_url = f"/api/call-feedback/jobs/{job.id}"
+    return JSONResponse(status_code=202, content=body, headers={"Location": status_url})
+
 @app.get("/api/call-feedback")
 @limiter.limit("20/minute")
 async def call_feedback(request: Request, call_id: str = Query(...)):
-    """Get feedback for a specific call."""
+    """Get feedback for a specific call, starting a background feedback job if needed."""
     try:
-        return await CastingFit_service.get_call_feedback(call_id)
+        # Completed calls are served from the persistent feedback store
+        stored = await CastingFit_service.get_stored_feedback(call_id)
+        if stored is not None:
+            return stored
+        # Concurrent requests for the same call join one feedback job
+        job = CastingFit_service.start_feedback_job(call_id)
+        return _feedback_job_response(job)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in call_feedback: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/call-feedback/stream")
+@limiter.limit("20/minute")
+async def call_feedback_stream(request: Request, call_id: str = Query(...)):
+    """Stream feedback for a specific call as server-sent events."""
+    return sse_response(CastingFit_service.stream_call_feedback(call_id))
+
+@app.get("/api/call-feedback/jobs/{job_id}")
+async def call_feedback_job(job_id: str):
+    """Get the status and result of a call feedback job."""
+    job = CastingFit_service.feedback_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Feedback job not found.")
+    return job.to_dict()
+
+@app.post("/api/vapi/webhook")
+async def vapi_webhook(request: Request):
+    """Receive VAPI server messages; ended calls are queued for feedback precomputation."""
+    if not os.getenv("VAPI_WEBHOOK_SECRET"):
+        raise HTTPException(status_code=503, detail="VAPI_WEBHOOK_SECRET not set in environment.")
+    if not verify_secret(request.headers.get(SECRET_HEADER)):
+        raise HTTPException(status_code=401, detail="Invalid webhook secret.")
+    try:
+        payload = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Webhook body must be JSON.")
+    event = parse_call_event(payload)
+    if event is None:
+        return {"received": True, "queued": False}
+    if not feedback_precomputer.enqueue(event):
+        # VAPI retries failed deliveries; the on-demand feedback path still works meanwhile
+        raise HTTPException(status_code=503, detail="Webhook queue is full.", headers={"Retry-After": "5"})
+    return JSONResponse(status_code=202, content={"received": True, "queued": True, "call_id": event.call_id})
+
 @app.get("/api/health")
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/api/ready")
+async def readiness_check():
+    """503 until the worker's background warm-up has succeeded; for load balancer readiness probes."""
+    if not getattr(app.state, "ready", False):
+        error = getattr(app.state, "warm_up_error", None)
+        if error:
+            return JSONResponse(status_code=503, content={"status": "failed", "detail": error})
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    return {"status": "ready"}
+
+@app.get("/api/metrics")
+async def prometheus_metrics():
+    """Prometheus-format metrics for this worker."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/cache-stats")
+async def cache_stats():
+    """Hit/miss counters for the result caches."""
+    return {
+        "profile_results": profile_service.result_cache.snapshot(),
+        "tts_audio": CastingFit_service.tts_cache.snapshot(),
+    }
+
 @app.get("/")
 def root():
-    return {"message": "API is running"} 
\ No newline at end of file
+    return {"message": "API is running"}
+
+metrics.startup_seconds.set(time.perf_counter() - STARTED_AT, phase="import")
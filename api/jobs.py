@@ -0,0 +1,145 @@
+"""
+Background job registry for long-running API work.
+
+Jobs run as asyncio tasks on the worker's event loop, so a single worker can
+track many pending jobs without tying up a request or a thread per job.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+from metrics import detach_request_timing
+
+logger = logging.getLogger(__name__)
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+
+@dataclass
+class Job:
+    key: str
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = JOB_PENDING
+    result: Any = None
+    error: Optional[str] = None
+    # HTTP status of the failure, for jobs whose work raised an HTTPException
+    error_status: Optional[int] = None
+    # Its response headers, e.g. Retry-After on a 503 shed by the upstream limiter
+    error_headers: Optional[Dict[str, str]] = None
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+    # Progress events published while the job runs (e.g. per-item results)
+    events: List[Any] = field(default_factory=list)
+    _changed: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    @property
+    def done(self) -> bool:
+        return self.status in (JOB_SUCCEEDED, JOB_FAILED)
+
+    def publish(self, event: Any):
+        self.events.append(event)
+        self.updated_at = time.time()
+        self._notify()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def follow(self, start: int = 0) -> AsyncIterator[Any]:
+        """Yield published events from `start`, then live ones until the job finishes."""
+        index = start
+        while True:
+            changed = self._changed
+            while index < len(self.events):
+                yield self.events[index]
+                index += 1
+            if self.done:
+                return
+            await changed.wait()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+class JobManager:
+    def __init__(self, ttl_seconds: float = 3600):
+        self.ttl_seconds = ttl_seconds
+        self._jobs: Dict[str, Job] = {}
+        self._by_key: Dict[str, str] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def find(self, key: str) -> Optional[Job]:
+        job_id = self._by_key.get(key)
+        return self._jobs.get(job_id) if job_id else None
+
+    def submit(self, key: str, work: Callable[[Job], Awaitable[Any]]) -> Job:
+        """Start a job for `key`, or return the live/finished job already registered for it."""
+        self._evict_expired()
+        existing = self.find(key)
+        if existing:
+            return existing
+
+        job = Job(key=key)
+        self._jobs[job.id] = job
+        self._by_key[key] = job.id
+        task = asyncio.create_task(self._run(job, work))
+        self._tasks[job.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.id, None))
+        return job
+
+    async def _run(self, job: Job, work: Callable[[Job], Awaitable[Any]]):
+        # The job outlives the request that submitted it, whose response is already sent
+        detach_request_timing()
+        job.status = JOB_RUNNING
+        job.updated_at = time.time()
+        try:
+            job.result = await work(job)
+            job.status = JOB_SUCCEEDED
+        except asyncio.CancelledError:
+            job.status = JOB_FAILED
+            job.error = "cancelled"
+            raise
+        except Exception as e:
+            logger.error(f"Job {job.id} ({job.key}) failed: {str(e)}")
+            job.status = JOB_FAILED
+            job.error = getattr(e, "detail", None) or str(e)
+            job.error_status = getattr(e, "status_code", None)
+            job.error_headers = getattr(e, "headers", None)
+        finally:
+            job.updated_at = time.time()
+            job._notify()
+
+    def forget(self, job_id: str):
+        """Drop a finished job so the next submit for its key starts afresh."""
+        job = self._jobs.pop(job_id, None)
+        if job and self._by_key.get(job.key) == job_id:
+            del self._by_key[job.key]
+
+    def _evict_expired(self):
+        cutoff = time.time() - self.ttl_seconds
+        expired = [job_id for job_id, job in self._jobs.items() if job.done and job.updated_at < cutoff]
+        for job_id in expired:
+            self.forget(job_id)
+
+    async def shutdown(self):
+        """Cancel outstanding jobs; called when the app shuts down."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
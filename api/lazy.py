@@ -0,0 +1,54 @@
+"""
+Deferred imports for heavy third-party modules.
+
+`lazy_import("openai")` returns a stand-in whose attributes trigger the real
+import on first use, so importing the API does not pay for libraries a worker
+may not need yet. The import goes through `importlib.import_module` and is
+therefore thread-safe. `preload` forces the imports, e.g. from a background
+warm-up once the server is already accepting connections.
+"""
+import importlib
+import threading
+from types import ModuleType
+from typing import Dict, Iterable, Optional
+
+
+class LazyModule:
+    def __init__(self, name: str):
+        self._name = name
+        self._module: Optional[ModuleType] = None
+        self._lock = threading.Lock()
+
+    def load(self) -> ModuleType:
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def __getattr__(self, attr: str):
+        return getattr(self.load(), attr)
+
+    def __repr__(self) -> str:
+        return f"<lazy module {self._name!r} ({'loaded' if self.loaded else 'not loaded'})>"
+
+
+_modules: Dict[str, LazyModule] = {}
+
+
+def lazy_import(name: str) -> LazyModule:
+    """Return `name` as a module that is only imported when first used."""
+    module = _modules.get(name)
+    if module is None:
+        module = _modules[name] = LazyModule(name)
+    return module
+
+
+def preload(names: Iterable[str]):
+    """Import the named modules now."""
+    for name in names:
+        lazy_import(name).load()
@@ -1,16 +1,23 @@
 # from langchain_huggingface import HuggingFaceEndpoint  # Removed, not needed
-import openai
+import asyncio
+import logging
 import os
-from typing import Any
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
 from dotenv import load_dotenv
+from constants import LLM_CONFIG, LOCAL_LLM_CONFIG
+from lazy import lazy_import
+from metrics import detach_request_timing, local_batch_size, record_upstream_error, span
+from rate_limits import get_upstream_limiter
 
 # Load environment variables
 load_dotenv()
 
-# Debug: Print all environment variables
-print("Environment variables:")
-print(f"LLM_PROVIDER: {os.getenv('LLM_PROVIDER')}")
-print(f"OPENAI_API_KEY exists: {bool(os.getenv('OPENAI_API_KEY'))}")
+logger = logging.getLogger(__name__)
+
+# The OpenAI SDK is slow to import; it loads when the first client is built
+openai = lazy_import("openai")
 
 class OpenAIClient:
     def __init__(self):
@@ -21,21 +28,257 @@ class OpenAIClient:
         self.temperature = float(os.getenv("MODEL_TEMPERATURE", 0.7))
         self.max_tokens = int(os.getenv("MODEL_MAX_TOKENS", 512))
         self.top_p = float(os.getenv("MODEL_TOP_P", 0.95))
-        self.client = openai.OpenAI(api_key=self.api_key)
-
-    def invoke(self, prompt: str) -> str:
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[{"role": "system", "content": prompt}],
-            temperature=self.temperature,
-            max_tokens=self.max_tokens,
-            top_p=self.top_p,
+        self.timeout = float(os.getenv("LLM_TIMEOUT_SECONDS", 120))
+        # Input limit in tokens for models with a small context; unset, CHUNKING_CONFIG sizes apply
+        self.max_input_tokens = int(os.getenv("LLM_MAX_INPUT_TOKENS", 0)) or None
+        # Long-lived client: its connection pool is reused across requests
+        # OPENAI_BASE_URL points the client at a compatible server (e.g. the benchmark stand-in)
+        self.client = openai.AsyncOpenAI(
+            api_key=self.api_key, base_url=os.getenv("OPENAI_BASE_URL") or None,
+            timeout=self.timeout, max_retries=2,
         )
+        # Caps in-flight completions per worker
+        self.semaphore = asyncio.Semaphore(int(os.getenv("LLM_MAX_CONCURRENCY", 16)))
+
+    @property
+    def settings(self) -> dict:
+        """Model settings that affect the output (used in result cache keys)."""
+        return {
+            "provider": "openai",
+            "model": self.model,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+            "top_p": self.top_p,
+        }
+
+    async def _rate_limited(self, e: Exception):
+        if isinstance(e, openai.RateLimitError):
+            await get_upstream_limiter().backoff("openai", e.response.headers.get("retry-after"))
+
+    async def ainvoke(self, prompt: str) -> str:
+        await get_upstream_limiter().acquire("openai")
+        async with self.semaphore:
+            with span("llm_invoke"):
+                try:
+                    response = await self.client.chat.completions.create(
+                        model=self.model,
+                        messages=[{"role": "system", "content": prompt}],
+                        temperature=self.temperature,
+                        max_tokens=self.max_tokens,
+                        top_p=self.top_p,
+                    )
+                except openai.OpenAIError as e:
+                    record_upstream_error("openai", type(e).__name__)
+                    await self._rate_limited(e)
+                    raise
         return response.choices[0].message.content
 
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        """Yield completion text as it is generated."""
+        await get_upstream_limiter().acquire("openai")
+        async with self.semaphore:
+            with span("llm_stream"):
+                try:
+                    stream = await self.client.chat.completions.create(
+                        model=self.model,
+                        messages=[{"role": "system", "content": prompt}],
+                        temperature=self.temperature,
+                        max_tokens=self.max_tokens,
+                        top_p=self.top_p,
+                        stream=True,
+                    )
+                    async for chunk in stream:
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            yield chunk.choices[0].delta.content
+                except openai.OpenAIError as e:
+                    record_upstream_error("openai", type(e).__name__)
+                    await self._rate_limited(e)
+                    raise
+
+    async def aclose(self):
+        await self.client.close()
+
+class MicroBatcher:
+    """Gather concurrent prompts into batches for a batch-capable backend.
+
+    A batch is dispatched when it reaches `max_batch_size` or `max_wait_seconds`
+    after its first prompt arrived, whichever comes first. `run_batch` is a
+    blocking function run on a single worker thread, one batch at a time.
+    """
+
+    def __init__(self, run_batch: Callable[[List[str]], List[str]], max_batch_size: int, max_wait_seconds: float):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self.queue: "asyncio.Queue[Tuple[str, asyncio.Future]]" = asyncio.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="llm-batch")
+        self._task: Optional[asyncio.Task] = None
+
+    async def submit(self, prompt: str) -> str:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((prompt, future))
+        return await future
+
+    async def _collect(self) -> List[Tuple[str, asyncio.Future]]:
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + self.max_wait_seconds
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        # Callers that gave up while queued are dropped from the batch
+        return [(prompt, future) for prompt, future in batch if not future.done()]
+
+    async def _loop(self):
+        # Started by whichever request submits first, but serves every later one
+        detach_request_timing()
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            if not batch:
+                continue
+            local_batch_size.observe(len(batch))
+            try:
+                with span("llm_local_batch"):
+                    outputs = await loop.run_in_executor(self.executor, self.run_batch, [prompt for prompt, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), output in zip(batch, outputs):
+                if not future.done():
+                    future.set_result(output)
+
+    async def aclose(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class HuggingFaceClient:
+    """Local CPU text generation with dynamic micro-batching.
+
+    Uses the model and sampling settings from LLM_CONFIG (HF_MODEL overrides
+    the model). transformers and torch are imported on first use, and the
+    model is loaded then too, so they are only needed with LLM_PROVIDER=huggingface.
+    """
+
+    def __init__(self):
+        self.model_name = os.getenv("HF_MODEL", LLM_CONFIG["model"])
+        self.temperature = LLM_CONFIG["temperature"]
+        self.max_tokens = LLM_CONFIG["max_tokens"]
+        self.top_p = LLM_CONFIG["top_p"]
+        self.top_k = LLM_CONFIG["top_k"]
+        # Longer prompts lose their start; prompt builders size their input to fit (see chunking.input_budget)
+        self.max_input_tokens = int(os.getenv("HF_MAX_INPUT_TOKENS", LOCAL_LLM_CONFIG["max_input_tokens"]))
+        self._model = None
+        self._tokenizer = None
+        self.batcher = MicroBatcher(
+            self._generate_batch,
+            max_batch_size=int(os.getenv("HF_MAX_BATCH_SIZE", LOCAL_LLM_CONFIG["max_batch_size"])),
+            max_wait_seconds=float(os.getenv("HF_BATCH_WAIT_MS", LOCAL_LLM_CONFIG["max_wait_ms"])) / 1000,
+        )
+
+    @property
+    def settings(self) -> dict:
+        """Model settings that affect the output (used in result cache keys)."""
+        return {
+            "provider": "huggingface",
+            "model": self.model_name,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+            "top_p": self.top_p,
+            "top_k": self.top_k,
+        }
+
+    def _load(self):
+        import torch
+        from transformers import AutoConfig, AutoModelForCausalLM, AutoModelForSeq2SeqLM, AutoTokenizer
+
+        torch.set_num_threads(int(os.getenv("HF_NUM_THREADS", os.cpu_count() or 1)))
+        config = AutoConfig.from_pretrained(self.model_name)
+        # flan-t5 and friends are encoder-decoder models; others are decoder-only
+        model_class = AutoModelForSeq2SeqLM if config.is_encoder_decoder else AutoModelForCausalLM
+        tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        # Prompts end with their instructions, so overlong ones are cut from the start
+        tokenizer.truncation_side = "left"
+        if not config.is_encoder_decoder:
+            tokenizer.padding_side = "left"
+            if tokenizer.pad_token is None:
+                tokenizer.pad_token = tokenizer.eos_token
+        model = model_class.from_pretrained(self.model_name)
+        model.eval()
+        self._tokenizer, self._model = tokenizer, model
+
+    def _generate_batch(self, prompts: List[str]) -> List[str]:
+        if self._model is None:
+            self._load()
+        import torch
+
+        lengths = [len(ids) for ids in self._tokenizer(prompts)["input_ids"]]
+        truncated = sum(length > self.max_input_tokens for length in lengths)
+        if truncated:
+            logger.warning(f"{truncated} of {len(prompts)} prompts exceed {self.max_input_tokens} input tokens "
+                           f"(longest {max(lengths)}); their start was cut off")
+        inputs = self._tokenizer(
+            prompts, return_tensors="pt", padding=True, truncation=True,
+            max_length=self.max_input_tokens,
+        )
+        with torch.inference_mode():
+            output_ids = self._model.generate(
+                **inputs,
+                max_new_tokens=self.max_tokens,
+                do_sample=self.temperature > 0,
+                temperature=self.temperature or None,
+                top_p=self.top_p,
+                top_k=self.top_k,
+                pad_token_id=self._tokenizer.pad_token_id,
+            )
+        if not self._model.config.is_encoder_decoder:
+            # Decoder-only outputs start with the (left-padded) prompt
+            output_ids = output_ids[:, inputs["input_ids"].shape[1]:]
+        return self._tokenizer.batch_decode(output_ids, skip_special_tokens=True)
+
+    async def ainvoke(self, prompt: str) -> str:
+        with span("llm_invoke"):
+            return await self.batcher.submit(prompt)
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        """Yield the completion; batched generation produces it in one piece."""
+        with span("llm_stream"):
+            text = await self.batcher.submit(prompt)
+        yield text
+
+    async def aclose(self):
+        await self.batcher.aclose()
+
+
+# Process-wide provider registry: one client per provider, built on first use
+_PROVIDERS = {
+    "openai": OpenAIClient,
+    "huggingface": HuggingFaceClient,
+}
+_clients: Dict[str, Any] = {}
+
 def get_llm_client():
     provider = os.getenv("LLM_PROVIDER", "openai").lower()
-    if provider == "openai":
-        return OpenAIClient()
-    else:
-        raise ValueError(f"Unsupported LLM provider: {provider}")
\ No newline at end of file
+    client = _clients.get(provider)
+    if client is None:
+        if provider not in _PROVIDERS:
+            raise ValueError(f"Unsupported LLM provider: {provider}")
+        client = _clients[provider] = _PROVIDERS[provider]()
+    return client
+
+async def shutdown():
+    """Close all provider clients; called when the app shuts down."""
+    clients = list(_clients.values())
+    _clients.clear()
+    await asyncio.gather(*(client.aclose() for client in clients), return_exceptions=True)
@@ -0,0 +1,173 @@
+"""
+Per-stage latency instrumentation and Prometheus-format metrics.
+
+Wrap each stage of a request in `span("stage_name")` to record its latency
+histogram, in-flight gauge and error count. Spans finished while a request
+is being handled are also reported in that response's `Server-Timing`
+header. Metrics are per worker process.
+"""
+import asyncio
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+LAG_SAMPLE_INTERVAL = 0.1
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(**labels) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _labels(**labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(k)} {v}" for k, v in self.values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        self.values[_labels(**labels)] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        # labels -> [bucket counts..., +Inf count], sum
+        self.values: Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = _labels(**labels)
+        counts, total = self.values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+        counts[bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def render(self) -> List[str]:
+        lines = []
+        for key, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = _format_labels(key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            cumulative += counts[-1]
+            le = _format_labels(key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total[0]}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+stage_latency = Histogram("profilecast_stage_latency_seconds", "Latency of each request stage")
+stage_in_flight = Gauge("profilecast_stage_in_flight", "Stages currently executing")
+stage_errors = Counter("profilecast_stage_errors_total", "Stages that raised an exception")
+upstream_errors = Counter("profilecast_upstream_errors_total", "Failed upstream calls by upstream and reason")
+upstream_shed = Counter("profilecast_upstream_shed_total", "Upstream calls rejected by the upstream rate limiter")
+request_latency = Histogram("profilecast_http_request_duration_seconds", "HTTP request latency by route")
+requests_in_flight = Gauge("profilecast_http_requests_in_flight", "HTTP requests currently being handled")
+event_loop_lag = Histogram("profilecast_event_loop_lag_seconds", "How late the event loop ran a scheduled wakeup", LAG_BUCKETS)
+local_batch_size = Histogram("profilecast_llm_local_batch_size", "Prompts per local model batch", BATCH_SIZE_BUCKETS)
+webhook_queue_depth = Gauge("profilecast_webhook_queue_depth", "Webhook call events waiting for a feedback worker")
+startup_seconds = Gauge("profilecast_startup_seconds", "Seconds from the app module starting to import to each startup phase")
+
+REGISTRY = [
+    stage_latency, stage_in_flight, stage_errors, upstream_errors, upstream_shed,
+    request_latency, requests_in_flight, event_loop_lag, local_batch_size, webhook_queue_depth,
+    startup_seconds,
+]
+
+# Timings of spans finished during the current request, for the Server-Timing header
+_request_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def span(stage: str):
+    """Time a stage of work."""
+    stage_in_flight.inc(stage=stage)
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        stage_errors.inc(stage=stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        stage_in_flight.dec(stage=stage)
+        stage_latency.observe(elapsed, stage=stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((stage, elapsed))
+
+
+def record_upstream_error(upstream: str, reason: str):
+    upstream_errors.inc(upstream=upstream, reason=reason)
+
+
+def start_request_timing() -> List[Tuple[str, float]]:
+    timings: List[Tuple[str, float]] = []
+    _request_timings.set(timings)
+    return timings
+
+
+def detach_request_timing():
+    """Stop reporting spans to the current request; call first in tasks that can outlive it.
+
+    Tasks copy the context of the request that created them, timings included.
+    """
+    _request_timings.set(None)
+
+
+def server_timing_header(timings: List[Tuple[str, float]], total: float) -> str:
+    entries = [f"{stage};dur={elapsed * 1000:.1f}" for stage, elapsed in timings]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+async def monitor_event_loop_lag(interval: float = LAG_SAMPLE_INTERVAL):
+    """Sample event-loop lag until cancelled; anything blocking the loop shows up here."""
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        event_loop_lag.observe(max(0.0, time.perf_counter() - start - interval))
+
+
+def render() -> str:
+    """Render all metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,225 @@
+"""
+Audio preparation for speech-to-text.
+
+Uploads are streamed to a temporary file in chunks instead of being read
+into memory whole, then downmixed and resampled to AUDIO_CONFIG before
+being forwarded to VAPI:
+
+- WAV input is converted in the shared process pool with the stdlib.
+- Compressed input (WebM/Ogg/MP4 from browsers) is converted by ffmpeg,
+  when it is installed, with the upload piped straight into it. So is WAV
+  input the stdlib cannot read.
+- Anything else is forwarded unchanged.
+
+The format is sniffed from the upload's first bytes: browsers record WebM or
+Ogg whatever name and content type the client gives the file.
+"""
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+import warnings
+import wave
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, BinaryIO, Optional, Tuple
+from fastapi import HTTPException, UploadFile
+from constants import AUDIO_CONFIG
+from metrics import span
+import workers
+from workers import run_in_process
+
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore", DeprecationWarning)
+    try:
+        import audioop
+    except ImportError:  # removed in Python 3.13; WAV input then goes through ffmpeg
+        audioop = None
+
+logger = logging.getLogger(__name__)
+
+FFMPEG = shutil.which("ffmpeg")
+WAV_FRAMES_PER_BLOCK = 64 * 1024
+_conversions = asyncio.Semaphore(AUDIO_CONFIG["max_concurrent_conversions"])
+
+PreparedAudio = Tuple[str, BinaryIO, str]
+
+
+# (extension, content type) by the container's magic bytes
+AUDIO_FORMATS = {
+    "wav": ("wav", "audio/wav"),
+    "webm": ("webm", "audio/webm"),
+    "ogg": ("ogg", "audio/ogg"),
+    "mp4": ("m4a", "audio/mp4"),
+}
+
+
+def _sniff_format(head: bytes) -> Optional[str]:
+    """Identify the audio container from the first 12 bytes of a file."""
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return "wav"
+    if head[:4] == b"\x1aE\xdf\xa3":
+        return "webm"
+    if head[:4] == b"OggS":
+        return "ogg"
+    if head[4:8] == b"ftyp":
+        return "mp4"
+    return None
+
+
+async def _read_head(file: UploadFile) -> bytes:
+    head = await file.read(12)
+    await file.seek(0)
+    return head
+
+
+def _resample_wav(src_path: str, dst_path: str, sample_rate: int, channels: int) -> int:
+    """Downmix and resample a PCM WAV file block by block; returns the output size in bytes."""
+    with wave.open(src_path, "rb") as src, wave.open(dst_path, "wb") as dst:
+        in_channels, width, in_rate = src.getnchannels(), src.getsampwidth(), src.getframerate()
+        dst.setnchannels(channels)
+        dst.setsampwidth(2)
+        dst.setframerate(sample_rate)
+        state = None
+        while True:
+            block = src.readframes(WAV_FRAMES_PER_BLOCK)
+            if not block:
+                break
+            if width != 2:
+                block = audioop.lin2lin(block, width, 2)
+            if in_channels == 2 and channels == 1:
+                block = audioop.tomono(block, 2, 0.5, 0.5)
+            elif in_channels != channels:
+                raise ValueError(f"Unsupported channel conversion: {in_channels} -> {channels}")
+            if in_rate != sample_rate:
+                block, state = audioop.ratecv(block, 2, channels, in_rate, sample_rate, state)
+            dst.writeframes(block)
+    return os.path.getsize(dst_path)
+
+
+async def _spool(file: UploadFile, path: str) -> int:
+    """Copy an upload to `path` chunk by chunk; returns the number of bytes written."""
+    size = 0
+    with open(path, "wb") as out:
+        while chunk := await file.read(AUDIO_CONFIG["upload_chunk_bytes"]):
+            size += len(chunk)
+            if size > AUDIO_CONFIG["max_upload_bytes"]:
+                raise HTTPException(status_code=413, detail="Audio upload is too large.")
+            out.write(chunk)
+    return size
+
+
+def _ffmpeg_args(source: str, dst_path: str) -> list:
+    return [
+        FFMPEG, "-hide_banner", "-loglevel", "error", "-i", source,
+        "-ac", str(AUDIO_CONFIG["channels"]), "-ar", str(AUDIO_CONFIG["sample_rate"]),
+        "-f", AUDIO_CONFIG["ffmpeg_output_format"], "-y", dst_path,
+    ]
+
+
+async def _ffmpeg_convert(file: UploadFile, dst_path: str) -> int:
+    """Pipe the upload through ffmpeg into `dst_path`; returns the input size in bytes."""
+    process = await asyncio.create_subprocess_exec(
+        *_ffmpeg_args("pipe:0", dst_path), stdin=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+    )
+    size = 0
+    try:
+        try:
+            while chunk := await file.read(AUDIO_CONFIG["upload_chunk_bytes"]):
+                size += len(chunk)
+                if size > AUDIO_CONFIG["max_upload_bytes"]:
+                    raise HTTPException(status_code=413, detail="Audio upload is too large.")
+                process.stdin.write(chunk)
+                await process.stdin.drain()
+            process.stdin.close()
+        except (BrokenPipeError, ConnectionResetError):
+            # ffmpeg exited early (e.g. unreadable input); its stderr says why
+            pass
+        _, stderr = await process.communicate()
+    except BaseException:
+        if process.returncode is None:
+            process.kill()
+        raise
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {stderr.decode(errors='replace')[:500]}")
+    return size
+
+
+async def _ffmpeg_convert_file(src_path: str, dst_path: str):
+    """Convert an already spooled file with ffmpeg."""
+    process = await asyncio.create_subprocess_exec(
+        *_ffmpeg_args(src_path, dst_path), stdin=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        _, stderr = await process.communicate()
+    except BaseException:
+        if process.returncode is None:
+            process.kill()
+        raise
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {stderr.decode(errors='replace')[:500]}")
+
+
+async def _convert(file: UploadFile, workdir: str) -> Optional[PreparedAudio]:
+    base = os.path.splitext(file.filename or "audio")[0]
+    fmt = AUDIO_CONFIG["ffmpeg_output_format"]
+    dst_ffmpeg = os.path.join(workdir, f"output.{fmt}")
+    if _sniff_format(await _read_head(file)) == "wav" and audioop is not None:
+        src_path = os.path.join(workdir, "input.wav")
+        dst_path = os.path.join(workdir, "output.wav")
+        in_size = await _spool(file, src_path)
+        try:
+            out_size = await run_in_process(
+                _resample_wav, src_path, dst_path, AUDIO_CONFIG["sample_rate"], AUDIO_CONFIG["channels"])
+        except (wave.Error, EOFError, ValueError) as e:
+            if not FFMPEG:
+                logger.warning(f"Could not resample WAV upload, forwarding as-is: {e}")
+                return base + ".wav", open(src_path, "rb"), "audio/wav"
+            # e.g. compressed WAV codecs the stdlib cannot read
+            logger.info(f"Could not resample WAV upload with the stdlib ({e}), trying ffmpeg")
+            await _ffmpeg_convert_file(src_path, dst_ffmpeg)
+            logger.info(f"Converted WAV upload {in_size} -> {os.path.getsize(dst_ffmpeg)} bytes")
+            return f"{base}.{fmt}", open(dst_ffmpeg, "rb"), f"audio/{fmt}"
+        except asyncio.CancelledError:
+            # Timed out: the resample keeps running in the pool unless the pool is recycled
+            workers.recycle()
+            raise
+        logger.info(f"Resampled WAV upload {in_size} -> {out_size} bytes")
+        return base + ".wav", open(dst_path, "rb"), "audio/wav"
+    if FFMPEG:
+        in_size = await _ffmpeg_convert(file, dst_ffmpeg)
+        logger.info(f"Converted {file.content_type} upload {in_size} -> {os.path.getsize(dst_ffmpeg)} bytes")
+        return f"{base}.{fmt}", open(dst_ffmpeg, "rb"), f"audio/{fmt}"
+    return None
+
+
+@asynccontextmanager
+async def prepare_audio(file: UploadFile) -> AsyncIterator[PreparedAudio]:
+    """Yield (filename, file object, content type) for the audio to forward to speech-to-text."""
+    with tempfile.TemporaryDirectory(prefix="stt-") as workdir:
+        prepared = None
+        try:
+            async with _conversions:
+                with span("audio_convert"):
+                    prepared = await asyncio.wait_for(_convert(file, workdir), AUDIO_CONFIG["conversion_timeout_seconds"])
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="Timed out converting audio.")
+        except RuntimeError as e:
+            logger.warning(f"Audio conversion failed, forwarding original upload: {e}")
+            await file.seek(0)
+
+        if prepared is None:
+            # No local conversion available: stream the original upload from its spool file,
+            # labelled with its real format rather than the client's
+            path = os.path.join(workdir, "original")
+            sniffed = AUDIO_FORMATS.get(_sniff_format(await _read_head(file)))
+            await _spool(file, path)
+            if sniffed:
+                ext, content_type = sniffed
+                prepared = (f"{os.path.splitext(file.filename or 'audio')[0]}.{ext}", open(path, "rb"), content_type)
+            else:
+                prepared = (file.filename or "audio", open(path, "rb"), file.content_type or "application/octet-stream")
+        try:
+            yield prepared
+        finally:
+            prepared[1].close()
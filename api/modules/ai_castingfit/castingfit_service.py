@@ -1,44 +1,86 @@
 """
 CastingFit service module for handling CastingFit-related operations.
 """
+import asyncio
 import logging
 import traceback
+from typing import AsyncIterator, List, Optional, Tuple
 from fastapi import HTTPException, UploadFile, File, Query
-import requests
+from cache import SingleFlight, cache_key, create_cache
+from chunking import condense, input_budget
+from http_client import get_http_client
 from llm_providers import get_llm_client
-from config import Config
+from config import Config, get_endpoint
+from constants import CHUNKING_CONFIG, FEEDBACK_POLL_CONFIG, TTS_CONFIG
+from jobs import JOB_FAILED, JOB_SUCCEEDED, Job, JobManager
+from metrics import span
+from modules.ai_castingfit.audio import prepare_audio
+from modules.ai_castingfit.feedback_parser import IncrementalJSONParser, normalize_feedback, parse_feedback
+from modules.ai_castingfit.feedback_store import FeedbackStore
 import json
 import time
 
 logger = logging.getLogger(__name__)
 
+# Bump when the feedback prompt or output schema changes, so stored feedback is regenerated
+FEEDBACK_PROMPT_VERSION = "1"
+# Bump when the TTS voice or request payload changes, so cached audio is resynthesized
+TTS_CACHE_VERSION = "1"
+# Feedback formats that are returned but not stored, so a later request (or webhook) tries again
+UNSTORED_FORMATS = ("plain", "no_transcript", "truncated")
+
 class CastingFitService:
     def __init__(self, vapi_api_key: str):
         self.vapi_api_key = vapi_api_key
-        self.vapi_base_url = "https://api.vapi.ai/v1/speech-to-text"
-        self.vapi_tts_url = "https://api.vapi.ai/v1/text-to-speech"
+        self.vapi_base_url = get_endpoint("speech_to_text")
+        self.vapi_tts_url = get_endpoint("text_to_speech")
+        self.vapi_call_url = get_endpoint("call_feedback")
+        self.feedback_jobs = JobManager(ttl_seconds=FEEDBACK_POLL_CONFIG["job_ttl_seconds"])
+        self.feedback_store = FeedbackStore()
+        self.tts_cache = create_cache("tts_audio")
+        self.tts_inflight = SingleFlight()
 
     async def speech_to_text(self, file: UploadFile):
         """Convert speech to text using VAPI."""
         try:
             if not self.vapi_api_key:
                 raise HTTPException(status_code=500, detail="VAPI_API_KEY not set in environment.")
-            audio_bytes = await file.read()
             headers = {"Authorization": f"Bearer {self.vapi_api_key}"}
-            files = {"file": (file.filename, audio_bytes, file.content_type)}
-            response = requests.post(self.vapi_base_url, headers=headers, files=files)
+            # The upload is spooled and converted to 16 kHz mono on disk, then streamed to VAPI
+            async with prepare_audio(file) as (filename, audio, content_type):
+                files = {"file": (filename, audio, content_type)}
+                with span("vapi_stt"):
+                    response = await get_http_client("vapi").post(self.vapi_base_url, headers=headers, files=files)
             if response.status_code != 200:
                 logger.error(f"VAPI API error: {response.text}")
                 raise HTTPException(status_code=500, detail="VAPI API error: " + response.text)
             data = response.json()
             return {"text": data.get("text", "")}
+        except HTTPException as e:
+            if e.status_code != 500:
+                raise
+            logger.error(f"Error in VAPI speech-to-text: {str(e.detail)}")
+            raise
         except Exception as e:
             logger.error(f"Error in VAPI speech-to-text: {str(e)}")
             logger.error(f"Traceback: {traceback.format_exc()}")
             raise HTTPException(status_code=500, detail=str(e))
 
+    @staticmethod
+    def tts_key(text: str) -> str:
+        """Content hash of an utterance; keys the audio cache and doubles as its ETag."""
+        return cache_key("tts", TTS_CACHE_VERSION, " ".join(text.split()))
+
     async def text_to_speech(self, text: str):
-        """Convert text to speech using VAPI."""
+        """Convert text to speech using VAPI, serving repeated utterances from the audio cache."""
+        key = self.tts_key(text)
+        cached = await self.tts_cache.get(key)
+        if cached is not None:
+            return cached
+        # Concurrent requests for the same utterance share one VAPI call
+        return await self.tts_inflight.do(key, lambda: self._synthesize(key, text))
+
+    async def _synthesize(self, key: str, text: str):
         try:
             if not self.vapi_api_key:
                 raise HTTPException(status_code=500, detail="VAPI_BE_API_KEY not set in environment.")
@@ -47,171 +89,265 @@ class CastingFitService:
                 "Authorization": f"Bearer {self.vapi_api_key}",
                 "Content-Type": "application/json"
             }
-            response = requests.post(self.vapi_tts_url, headers=headers, json=payload)
+            with span("vapi_tts"):
+                response = await get_http_client("vapi").post(self.vapi_tts_url, headers=headers, json=payload)
             if response.status_code != 200:
                 logger.error(f"VAPI TTS API error: {response.text}")
                 raise HTTPException(status_code=500, detail="VAPI TTS API error: " + response.text)
             data = response.json()
-            return {"audio": data.get("audio", "")}
+            result = {"audio": data.get("audio", "")}
+            if result["audio"]:
+                await self.tts_cache.set(key, result)
+            return result
+        except HTTPException as e:
+            if e.status_code != 500:
+                raise
+            logger.error(f"Error in VAPI text-to-speech: {str(e.detail)}")
+            raise
         except Exception as e:
             logger.error(f"Error in VAPI text-to-speech: {str(e)}")
             logger.error(f"Traceback: {traceback.format_exc()}")
             raise HTTPException(status_code=500, detail=str(e))
 
-    async def get_call_feedback(self, call_id: str):
-        """Get feedback for a specific call."""
-        try:
-            if not self.vapi_api_key:
-                raise HTTPException(status_code=500, detail="VAPI_BE_API_KEY not set in environment.")
-            headers = {"Authorization": f"Bearer {self.vapi_api_key}"}
-            logger.info(f"VAPI_API_KEY used: {self.vapi_api_key}")
-            vapi_url = f"https://api.vapi.ai/call?id={call_id}"
-            
-            # Log request details
-            logger.info(f"Making VAPI request to: {vapi_url}")
+    async def prewarm_tts(self, phrases: Optional[List[str]] = None):
+        """Synthesize known interviewer phrases ahead of the first session."""
+        phrases = TTS_CONFIG["prewarm_phrases"] if phrases is None else phrases
+        if not self.vapi_api_key or not phrases:
+            return
+        semaphore = asyncio.Semaphore(TTS_CONFIG["prewarm_concurrency"])
+
+        async def warm(phrase: str):
+            async with semaphore:
+                try:
+                    await self.text_to_speech(phrase)
+                except HTTPException as e:
+                    logger.warning(f"TTS pre-warm failed for {phrase!r}: {e.detail}")
+
+        with span("tts_prewarm"):
+            await asyncio.gather(*(warm(phrase) for phrase in phrases))
+        logger.info(f"TTS cache pre-warmed with {len(phrases)} phrases")
+
+    def _call_url(self, call_id: str) -> str:
+        return f"{self.vapi_call_url}?id={call_id}"
+
+    async def fetch_call(self, call_id: str) -> dict:
+        """Fetch the current state of a VAPI call."""
+        headers = {"Authorization": f"Bearer {self.vapi_api_key}"}
+        vapi_url = self._call_url(call_id)
+
+        # Log request details
+        logger.info(f"Making VAPI request to: {vapi_url}")
+        # Payload dumps are only serialized when DEBUG logging is on
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
             logger.debug(f"Request headers: {json.dumps({k: '***' if k == 'Authorization' else v for k, v in headers.items()}, indent=2)}")
-            
-            # First attempt
-            response = requests.get(vapi_url, headers=headers)
-            logger.info(f"VAPI response status: {response.status_code}")
+
+        with span("vapi_call_fetch"):
+            response = await get_http_client("vapi").get(vapi_url, headers=headers)
+        logger.info(f"VAPI response status: {response.status_code}")
+        if debug:
             logger.debug(f"VAPI response headers: {json.dumps(dict(response.headers), indent=2)}")
-            
-            if response.status_code != 200:
-                logger.error(f"VAPI call fetch error: {response.text}")
-                raise HTTPException(status_code=500, detail="VAPI call fetch error: " + response.text)
-            
-            call_data = response.json()
+
+        if response.status_code != 200:
+            logger.error(f"VAPI call fetch error: {response.text}")
+            raise HTTPException(status_code=500, detail="VAPI call fetch error: " + response.text)
+
+        call_data = response.json()
+        if debug:
             logger.debug(f"VAPI call_data (raw) for call_id={call_id}: {json.dumps(call_data, indent=2)}")
-            
-            if isinstance(call_data, list):
-                call_data = call_data[0] if call_data else {}
-            if not isinstance(call_data, dict):
-                logger.error(f"VAPI call_data is not a dict after extraction: {call_data}")
-                raise HTTPException(status_code=500, detail="Invalid VAPI response format.")
-                
-            # Check if call is in progress
-            if call_data.get('status') == 'in-progress':
-                logger.info(f"Call {call_id} is in-progress. Waiting 30 seconds before retrying...")
-                time.sleep(30)
-                
-                # Log retry request
-                logger.info(f"Making retry VAPI request to: {vapi_url}")
-                logger.debug(f"Retry request headers: {json.dumps({k: '***' if k == 'Authorization' else v for k, v in headers.items()}, indent=2)}")
-                
-                response = requests.get(vapi_url, headers=headers)
-                logger.info(f"Retry VAPI response status: {response.status_code}")
-                logger.debug(f"Retry VAPI response headers: {json.dumps(dict(response.headers), indent=2)}")
-                
-                call_data = response.json()
-                logger.debug(f"VAPI call_data (after wait) for call_id={call_id}: {json.dumps(call_data, indent=2)}")
-                
-                if isinstance(call_data, list):
-                    call_data = call_data[0] if call_data else {}
-                if not isinstance(call_data, dict):
-                    logger.error(f"VAPI call_data is not a dict after extraction: {call_data}")
-                    raise HTTPException(status_code=500, detail="Invalid VAPI response format.")
-                if call_data.get('status') == 'in-progress':
-                    logger.warning(f"Call {call_id} still in-progress after delay. Returning processing status.")
-                    return {"feedback_summary": None, "processing": True}
-            
-            messages = call_data.get("messages", [])
-            transcript = "\n".join([f"{msg.get('role','')}: {msg.get('message','')}" for msg in messages])
-            
-            # If no transcript found, wait 20 seconds and retry once
-            if not transcript.strip():
-                logger.warning(f"No transcript found for call_id={call_id}. Retrying after 20 seconds...")
-                time.sleep(20)
-                
-                # Log transcript retry request
-                logger.info(f"Making transcript retry VAPI request to: {vapi_url}")
-                logger.debug(f"Transcript retry request headers: {json.dumps({k: '***' if k == 'Authorization' else v for k, v in headers.items()}, indent=2)}")
-                
-                response = requests.get(vapi_url, headers=headers)
-                logger.info(f"Transcript retry VAPI response status: {response.status_code}")
-                logger.debug(f"Transcript retry VAPI response headers: {json.dumps(dict(response.headers), indent=2)}")
-                
-                call_data = response.json()
-                if isinstance(call_data, list):
-                    call_data = call_data[0] if call_data else {}
-                messages = call_data.get("messages", [])
-                transcript = "\n".join([f"{msg.get('role','')}: {msg.get('message','')}" for msg in messages])
-                
-                if not transcript.strip():
-                    logger.warning(f"Still no transcript found for call_id={call_id} after retry")
-                    return {"feedback_summary": "No transcript available for this call."}
-            
-            # Log transcript details
-            logger.info(f"Transcript length: {len(transcript)} characters")
+
+        if isinstance(call_data, list):
+            call_data = call_data[0] if call_data else {}
+        if not isinstance(call_data, dict):
+            logger.error(f"VAPI call_data is not a dict after extraction: {call_data}")
+            raise HTTPException(status_code=500, detail="Invalid VAPI response format.")
+        return call_data
+
+    @staticmethod
+    def build_transcript(call_data: dict) -> str:
+        messages = call_data.get("messages", [])
+        return "\n".join([f"{msg.get('role','')}: {msg.get('message','')}" for msg in messages])
+
+    async def wait_for_transcript(self, call_id: str) -> Optional[str]:
+        """Poll VAPI with exponential backoff until the call has ended and has a transcript.
+
+        Returns None when the call ended without a transcript.
+        """
+        poll = FEEDBACK_POLL_CONFIG
+        delay = poll["initial_delay_seconds"]
+        deadline = time.monotonic() + poll["max_wait_seconds"]
+        empty_retries = poll["empty_transcript_retries"]
+
+        while True:
+            call_data = await self.fetch_call(call_id)
+            in_progress = call_data.get('status') == 'in-progress'
+            transcript = self.build_transcript(call_data)
+
+            if not in_progress and transcript.strip():
+                return transcript
+            if not in_progress:
+                if empty_retries <= 0:
+                    logger.warning(f"Still no transcript found for call_id={call_id} after retries")
+                    return None
+                empty_retries -= 1
+                logger.warning(f"No transcript found for call_id={call_id}. Retrying in {delay} seconds...")
+            else:
+                logger.info(f"Call {call_id} is in-progress. Checking again in {delay} seconds...")
+
+            if time.monotonic() + delay > deadline:
+                raise HTTPException(status_code=504, detail=f"Timed out waiting for call {call_id} to finish.")
+            # The in-flight gauge for this stage shows how many calls are waiting between polls
+            with span("vapi_poll_wait"):
+                await asyncio.sleep(delay)
+            delay = min(delay * poll["backoff_multiplier"], poll["max_delay_seconds"])
+
+    @staticmethod
+    def _feedback_prompt(transcript: str) -> str:
+        return (
+            "You are an expert CastingFit coach. Analyze the following CastingFit transcript and provide a feedback summary for the candidate. "
+            "Return your feedback as a JSON object with the following structure: "
+            '{"role": "...", "skills": {"must": [{"name": "...", "status": "..."}, ...], "should": [...], "could": [...]}, "summary": {"take": "...", "strong": [], "ok": [], "weak": []}}. '
+            "Keep responses concise. For each skill, set status to: good, ok, weak, or neutral. "
+            "Keep arrays short (max 3 items).\n\nTranscript:\n" + transcript
+        )
+
+    @staticmethod
+    def _transcript_chunk_prompt(chunk: str, index: int, total: int) -> str:
+        return (
+            f"You are an expert CastingFit coach. Below is part {index} of {total} of a CastingFit transcript. "
+            "Write concise notes on it: the role discussed, each skill the candidate demonstrated or lacked "
+            "(with a strength of good, ok, weak or neutral), and notable strong and weak points. "
+            "Use short bullet points only.\n\nTranscript part:\n" + chunk
+        )
+
+    async def _condense_transcript(self, llm, transcript: str) -> str:
+        """Map-reduce transcripts that are too long for one feedback prompt."""
+        max_tokens = input_budget(llm, CHUNKING_CONFIG["max_input_tokens"], self._feedback_prompt(""))
+        return await condense(llm, transcript, self._transcript_chunk_prompt, max_tokens)
+
+    async def analyze_transcript(self, transcript: str, job: Optional[Job] = None) -> dict:
+        """Run the LLM feedback analysis over a finished transcript.
+
+        With a `job`, the LLM output is streamed and published to it as token and partial feedback events.
+        """
+        # Log transcript details
+        logger.info(f"Transcript length: {len(transcript)} characters")
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
             logger.debug(f"Transcript content: {transcript[:500]}...")  # Log first 500 chars
-            
-            llm = get_llm_client()
-            prompt = (
-                "You are an expert CastingFit coach. Analyze the following CastingFit transcript and provide a feedback summary for the candidate. "
-                "Return your feedback as a JSON object with the following structure: "
-                '{"role": "...", "skills": {"must": [{"name": "...", "status": "..."}, ...], "should": [...], "could": [...]}, "summary": {"take": "...", "strong": [], "ok": [], "weak": []}}. '
-                "Keep responses concise. For each skill, set status to: good, ok, weak, or neutral. "
-                "Keep arrays short (max 3 items).\n\nTranscript:\n" + transcript
-            )
-            feedback = llm.invoke(prompt)
-            import json as pyjson
+        llm = get_llm_client()
+        transcript = await self._condense_transcript(llm, transcript)
+        prompt = self._feedback_prompt(transcript)
+        if job is None:
+            feedback = await llm.ainvoke(prompt)
+        else:
+            parser = IncrementalJSONParser()
+            parts = []
+            emitted = 0
+            async for token in llm.astream(prompt):
+                parts.append(token)
+                parser.feed(token)
+                job.publish(("token", {"text": token}))
+                if parser.completed != emitted:
+                    emitted = parser.completed
+                    partial = normalize_feedback(parser.snapshot())
+                    if partial is not None:
+                        job.publish(("partial", partial))
+            feedback = "".join(parts)
+        if debug:
             logger.debug(f"Raw LLM feedback: {feedback}")
-            
-            def fix_json_arrays(text):
-                # Fix truncated arrays by adding closing brackets
-                import re
-                # Find arrays that are opened but not closed
-                while True:
-                    # Find position of last [
-                    last_open = text.rfind('[')
-                    if last_open == -1:
-                        break
-                    # Count brackets after this position
-                    sub_str = text[last_open:]
-                    open_count = sub_str.count('[')
-                    close_count = sub_str.count(']')
-                    if open_count > close_count:
-                        text = text + ']'
-                    else:
-                        break
-                return text
-
-            def extract_json(text):
-                import re
-                match = re.search(r'\{[\s\S]*\}', text)
-                if match:
-                    json_str = match.group(0)
-                    # Fix missing closing braces and arrays
-                    open_count = json_str.count('{')
-                    close_count = json_str.count('}')
-                    if open_count > close_count:
-                        json_str += '}'
-                    json_str = fix_json_arrays(json_str)
-                    return json_str
-                return None
-
-            try:
-                if isinstance(feedback, dict):
-                    return feedback
-                # Try direct parse
-                feedback_json = pyjson.loads(feedback)
-                return feedback_json
-            except Exception:
-                # Try to extract and fix JSON substring
-                json_str = extract_json(feedback)
-                if json_str:
-                    try:
-                        feedback_json = pyjson.loads(json_str)
-                        # Ensure arrays are present even if empty
-                        if 'summary' in feedback_json:
-                            feedback_json['summary'].setdefault('strong', [])
-                            feedback_json['summary'].setdefault('ok', [])
-                            feedback_json['summary'].setdefault('weak', [])
-                        return feedback_json
-                    except Exception as e:
-                        logger.warning(f"Failed to parse fixed JSON: {e}")
-                logger.warning(f"LLM feedback could not be parsed as structured JSON. Returning fallback.")
-                return {"feedback_summary": feedback, "feedback_fallback": feedback, "format": "plain"}
+        return parse_feedback(feedback)
+
+    async def get_call_feedback(self, call_id: str, transcript: Optional[str] = None, job: Optional[Job] = None):
+        """Get feedback for a specific call, waiting for the call to finish if needed.
+
+        Pass `transcript` when the final transcript is already known (e.g. from a webhook) to skip polling VAPI.
+        When run as the call's feedback `job`, progress is published to it as (event, data) pairs.
+        """
+        try:
+            if not self.vapi_api_key:
+                raise HTTPException(status_code=500, detail="VAPI_BE_API_KEY not set in environment.")
+            stored = await self.get_stored_feedback(call_id)
+            if stored is not None:
+                return stored
+            if not transcript:
+                if job is not None:
+                    job.publish(("status", {"stage": "waiting_for_transcript"}))
+                transcript = await self.wait_for_transcript(call_id)
+            if transcript is None:
+                return {"feedback_summary": "No transcript available for this call.", "format": "no_transcript"}
+            if job is not None:
+                job.publish(("status", {"stage": "analyzing"}))
+            feedback = await self.analyze_transcript(transcript, job)
+            await self.store_feedback(call_id, feedback)
+            return feedback
+        except HTTPException as e:
+            if e.status_code != 500:
+                raise
+            logger.error(f"Error in call-feedback: {str(e.detail)}")
+            raise HTTPException(status_code=500, detail="Failed to generate call feedback summary.")
         except Exception as e:
             logger.error(f"Error in call-feedback: {str(e)}")
             logger.error(f"Traceback: {traceback.format_exc()}")
-            raise HTTPException(status_code=500, detail="Failed to generate call feedback summary.") 
\ No newline at end of file
+            raise HTTPException(status_code=500, detail="Failed to generate call feedback summary.")
+
+    async def stream_call_feedback(self, call_id: str) -> AsyncIterator[Tuple[str, dict]]:
+        """Yield (event, data) pairs for a call's feedback: LLM tokens, partial feedback objects, then the result.
+
+        The stream follows the call's feedback job, so it shares VAPI polling and LLM work with concurrent GETs.
+        """
+        try:
+            if not self.vapi_api_key:
+                raise HTTPException(status_code=500, detail="VAPI_BE_API_KEY not set in environment.")
+            job = self.feedback_jobs.find(call_id)
+            if job and job.status == JOB_SUCCEEDED:
+                self.settle_feedback_job(job)
+                yield "result", job.result
+                return
+            if job and job.status == JOB_FAILED:
+                # As with GET, a failure is reported once; a new request starts afresh
+                self.feedback_jobs.forget(job.id)
+                job = None
+            if job is None:
+                stored = await self.get_stored_feedback(call_id)
+                if stored is not None:
+                    yield "result", stored
+                    return
+                job = self.start_feedback_job(call_id)
+            async for event, data in job.follow():
+                yield event, data
+            self.settle_feedback_job(job)
+            if job.status == JOB_SUCCEEDED:
+                yield "result", job.result
+            else:
+                yield "error", {"status": job.error_status or 500, "detail": job.error or "Failed to generate call feedback summary."}
+        except HTTPException as e:
+            yield "error", {"status": e.status_code, "detail": e.detail}
+        except Exception as e:
+            logger.error(f"Error streaming call-feedback: {str(e)}")
+            logger.error(f"Traceback: {traceback.format_exc()}")
+            yield "error", {"status": 500, "detail": "Failed to generate call feedback summary."}
+
+    async def get_stored_feedback(self, call_id: str) -> Optional[dict]:
+        return await self.feedback_store.get(call_id, FEEDBACK_PROMPT_VERSION)
+
+    async def store_feedback(self, call_id: str, feedback: dict):
+        # Plain-text fallbacks and truncated output are not stored, so a retry can still produce complete feedback
+        if feedback.get("format") in UNSTORED_FORMATS:
+            return
+        await self.feedback_store.put(call_id, FEEDBACK_PROMPT_VERSION, feedback)
+
+    def settle_feedback_job(self, job: Job) -> bool:
+        """Forget a finished job unless its result was stored, so the next request for the call tries again.
+
+        Returns True if the job was forgotten.
+        """
+        if job.status == JOB_FAILED or (job.status == JOB_SUCCEEDED and job.result.get("format") in UNSTORED_FORMATS):
+            self.feedback_jobs.forget(job.id)
+            return True
+        return False
+
+    def start_feedback_job(self, call_id: str, transcript: Optional[str] = None) -> Job:
+        """Start (or join) the background feedback job for a call."""
+        return self.feedback_jobs.submit(call_id, lambda job: self.get_call_feedback(call_id, transcript, job))
+
@@ -0,0 +1,230 @@
+"""
+Incremental, truncation-tolerant parsing of LLM feedback output.
+
+`IncrementalJSONParser` consumes model output chunk by chunk in a single
+linear pass. It skips any prose or code fences before the first `{`,
+builds the object as values complete, and can snapshot a partial object at
+any point, so truncated output (e.g. cut off by max_tokens) still yields
+everything generated so far; such results are marked `format: "truncated"`. `normalize_feedback` then fits the result to
+the feedback schema: role, skills (must/should/could) and summary.
+"""
+import json
+import logging
+from typing import Any, List, Optional
+from metrics import span
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = " \t\r\n"
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+_LITERALS = {"true": True, "false": False, "null": None}
+_NO_VALUE = object()
+
+SKILL_TIERS = ("must", "should", "could")
+SKILL_STATUSES = ("good", "ok", "weak", "neutral")
+SUMMARY_LISTS = ("strong", "ok", "weak")
+
+
+class IncrementalJSONParser:
+    def __init__(self):
+        self.root: Optional[dict] = None
+        self.done = False
+        # Number of values completed so far; changes whenever the snapshot would
+        self.completed = 0
+        # Open containers, innermost last: [container, pending dict key]
+        self._stack: List[list] = []
+        self._in_string = False
+        self._string_is_key = False
+        self._string: List[str] = []
+        self._escape = False
+        self._unicode: Optional[str] = None
+        self._scalar: List[str] = []
+
+    def feed(self, chunk: str):
+        for ch in chunk:
+            if self.done:
+                return
+            self._consume(ch)
+
+    def _consume(self, ch: str):
+        if self._in_string:
+            self._consume_string(ch)
+            return
+        if self._scalar:
+            if ch not in _WHITESPACE and ch not in ",]}":
+                self._scalar.append(ch)
+                return
+            self._finish_scalar()
+        if not self._stack:
+            # Skip anything before the root object (prose, code fences)
+            if ch == '{':
+                self._open({})
+            return
+        if ch in _WHITESPACE or ch in ",:":
+            return
+        if ch == '{':
+            self._open({})
+        elif ch == '[':
+            self._open([])
+        elif ch in '}]':
+            self._close()
+        elif ch == '"':
+            container, key = self._stack[-1]
+            self._in_string = True
+            self._string_is_key = isinstance(container, dict) and key is None
+            self._string = []
+        else:
+            self._scalar.append(ch)
+
+    def _consume_string(self, ch: str):
+        if self._unicode is not None:
+            self._unicode += ch
+            if len(self._unicode) == 4:
+                try:
+                    self._string.append(chr(int(self._unicode, 16)))
+                except ValueError:
+                    pass
+                self._unicode = None
+        elif self._escape:
+            self._escape = False
+            if ch == 'u':
+                self._unicode = ""
+            else:
+                self._string.append(_ESCAPES.get(ch, ch))
+        elif ch == '\\':
+            self._escape = True
+        elif ch == '"':
+            self._in_string = False
+            value = "".join(self._string)
+            self._string = []
+            if self._string_is_key:
+                self._stack[-1][1] = value
+            else:
+                self._attach(value)
+                self.completed += 1
+        else:
+            self._string.append(ch)
+
+    def _open(self, container):
+        if self._stack:
+            self._attach(container)
+        else:
+            self.root = container
+        self._stack.append([container, None])
+
+    def _close(self):
+        self._stack.pop()
+        self.completed += 1
+        if not self._stack:
+            self.done = True
+
+    def _attach(self, value: Any):
+        frame = self._stack[-1]
+        container, key = frame
+        if isinstance(container, list):
+            container.append(value)
+        elif key is not None:
+            container[key] = value
+            frame[1] = None
+
+    @staticmethod
+    def _parse_scalar(token: str) -> Any:
+        if token in _LITERALS:
+            return _LITERALS[token]
+        try:
+            return int(token)
+        except ValueError:
+            pass
+        try:
+            return float(token)
+        except ValueError:
+            return _NO_VALUE
+
+    def _finish_scalar(self):
+        value = self._parse_scalar("".join(self._scalar))
+        self._scalar = []
+        if value is not _NO_VALUE:
+            self._attach(value)
+            self.completed += 1
+
+    def _pending_value(self) -> Any:
+        if self._in_string and not self._string_is_key:
+            return "".join(self._string)
+        if self._scalar:
+            return self._parse_scalar("".join(self._scalar))
+        return _NO_VALUE
+
+    def snapshot(self, pending: bool = True) -> Optional[dict]:
+        """Return a copy of everything parsed so far.
+
+        With `pending`, a trailing value that is still being written (e.g. half
+        a string) is included too; leave it out when the result is final.
+        """
+        if self.root is None:
+            return None
+        pending = self._pending_value() if pending else _NO_VALUE
+        if pending is _NO_VALUE or not self._stack:
+            return json.loads(json.dumps(self.root))
+        container, key = self._stack[-1]
+        if isinstance(container, list):
+            container.append(pending)
+            copy = json.loads(json.dumps(self.root))
+            container.pop()
+        elif key is not None:
+            container[key] = pending
+            copy = json.loads(json.dumps(self.root))
+            del container[key]
+        else:
+            copy = json.loads(json.dumps(self.root))
+        return copy
+
+
+def _as_list(value) -> list:
+    if isinstance(value, list):
+        return value
+    return [] if value is None else [value]
+
+
+def _normalize_skill(item) -> Optional[dict]:
+    if isinstance(item, str):
+        return {"name": item, "status": "neutral"} if item.strip() else None
+    if isinstance(item, dict) and item.get("name"):
+        status = str(item.get("status", "")).lower()
+        return {"name": str(item["name"]), "status": status if status in SKILL_STATUSES else "neutral"}
+    return None
+
+
+def normalize_feedback(data) -> Optional[dict]:
+    """Fit parsed output to the feedback schema; None if it doesn't look like feedback at all."""
+    if not isinstance(data, dict) or not {"role", "skills", "summary"} & data.keys():
+        return None
+    skills = data.get("skills") if isinstance(data.get("skills"), dict) else {}
+    summary = data.get("summary") if isinstance(data.get("summary"), dict) else {}
+    feedback = dict(data)
+    feedback["role"] = str(data.get("role") or "")
+    feedback["skills"] = {
+        tier: [skill for skill in map(_normalize_skill, _as_list(skills.get(tier))) if skill]
+        for tier in SKILL_TIERS
+    }
+    feedback["summary"] = {"take": str(summary.get("take") or "")}
+    for name in SUMMARY_LISTS:
+        feedback["summary"][name] = [str(item) for item in _as_list(summary.get(name)) if item is not None]
+    return feedback
+
+
+def parse_feedback(feedback) -> dict:
+    """Parse raw LLM feedback into the structured feedback dict, falling back to plain text."""
+    if isinstance(feedback, dict):
+        return normalize_feedback(feedback) or feedback
+    with span("feedback_parse"):
+        parser = IncrementalJSONParser()
+        parser.feed(feedback)
+    # A half-written trailing value is dropped; only completed values are kept
+    normalized = normalize_feedback(parser.snapshot(pending=False))
+    if normalized is None:
+        logger.warning(f"LLM feedback could not be parsed as structured JSON. Returning fallback.")
+        return {"feedback_summary": feedback, "feedback_fallback": feedback, "format": "plain"}
+    if not parser.done:
+        logger.warning("LLM feedback JSON was truncated; using the partial object.")
+        normalized["format"] = "truncated"
+    return normalized
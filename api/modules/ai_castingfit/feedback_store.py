@@ -0,0 +1,59 @@
+"""
+Persistent store of generated call feedback.
+
+A finished call's transcript never changes, so its feedback is computed once
+per prompt version and served from this SQLite store afterwards.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import Any, Optional
+from cache import CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+
+class FeedbackStore:
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(CACHE_DIR, "call_feedback.sqlite")
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS feedback ("
+                "call_id TEXT NOT NULL, prompt_version TEXT NOT NULL, feedback TEXT NOT NULL, "
+                "created_at REAL NOT NULL, PRIMARY KEY (call_id, prompt_version))"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10)
+
+    def _get(self, call_id: str, prompt_version: str) -> Optional[Any]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT feedback FROM feedback WHERE call_id = ? AND prompt_version = ?", (call_id, prompt_version)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _put(self, call_id: str, prompt_version: str, feedback: Any):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO feedback (call_id, prompt_version, feedback, created_at) VALUES (?, ?, ?, ?)",
+                (call_id, prompt_version, json.dumps(feedback), time.time()),
+            )
+
+    async def get(self, call_id: str, prompt_version: str) -> Optional[Any]:
+        try:
+            return await asyncio.to_thread(self._get, call_id, prompt_version)
+        except sqlite3.Error as e:
+            logger.warning(f"Feedback store read failed for call_id={call_id}: {e}")
+            return None
+
+    async def put(self, call_id: str, prompt_version: str, feedback: Any):
+        try:
+            await asyncio.to_thread(self._put, call_id, prompt_version, feedback)
+        except sqlite3.Error as e:
+            logger.warning(f"Feedback store write failed for call_id={call_id}: {e}")
@@ -0,0 +1,116 @@
+"""
+VAPI end-of-call webhook ingestion.
+
+VAPI posts server messages to the webhook when a call's status changes and
+when it ends. Verified end-of-call events are queued, and a small pool of
+worker tasks computes the call's feedback straight away (from the transcript
+in the report when present), so the frontend's later GET is a store read and
+polling VAPI for an in-progress call becomes the rare fallback.
+"""
+import asyncio
+import hmac
+import logging
+import os
+from dataclasses import dataclass
+from typing import List, Optional
+from constants import WEBHOOK_CONFIG
+from jobs import Job
+from metrics import span, webhook_queue_depth
+from modules.ai_castingfit.castingfit_service import CastingFitService
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "x-vapi-secret"
+
+
+@dataclass
+class CallEndedEvent:
+    call_id: str
+    transcript: Optional[str] = None
+
+
+def verify_secret(provided: Optional[str]) -> bool:
+    """Check the webhook's shared secret in constant time."""
+    expected = os.getenv("VAPI_WEBHOOK_SECRET", "")
+    if not expected or not provided:
+        return False
+    return hmac.compare_digest(provided.encode("utf-8"), expected.encode("utf-8"))
+
+
+def parse_call_event(payload: dict) -> Optional[CallEndedEvent]:
+    """Extract a finished call from a VAPI server message; None for events that need no work."""
+    message = payload.get("message") if isinstance(payload, dict) else None
+    if not isinstance(message, dict):
+        return None
+    event_type = message.get("type")
+    ended = event_type == "end-of-call-report" or (event_type == "status-update" and message.get("status") == "ended")
+    call = message.get("call") or {}
+    call_id = call.get("id") if isinstance(call, dict) else None
+    if not ended or not call_id or not isinstance(call_id, str):
+        return None
+    # A malformed artifact or message list is ignored; the worker then polls VAPI for the transcript
+    artifact = message.get("artifact")
+    messages = (artifact.get("messages") if isinstance(artifact, dict) else None) or message.get("messages")
+    messages = [msg for msg in messages if isinstance(msg, dict)] if isinstance(messages, list) else None
+    transcript = CastingFitService.build_transcript({"messages": messages}) if messages else None
+    return CallEndedEvent(call_id=call_id, transcript=transcript if transcript and transcript.strip() else None)
+
+
+class FeedbackPrecomputer:
+    def __init__(self, service: CastingFitService):
+        self.service = service
+        self.queue: "asyncio.Queue[CallEndedEvent]" = asyncio.Queue(maxsize=WEBHOOK_CONFIG["queue_size"])
+        self._workers: List[asyncio.Task] = []
+
+    def enqueue(self, event: CallEndedEvent) -> bool:
+        """Queue a finished call for feedback; False when the queue is full."""
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            return False
+        webhook_queue_depth.set(self.queue.qsize())
+        return True
+
+    def start(self):
+        self._workers = [asyncio.create_task(self._work()) for _ in range(WEBHOOK_CONFIG["workers"])]
+
+    async def _work(self):
+        while True:
+            event = await self.queue.get()
+            webhook_queue_depth.set(self.queue.qsize())
+            try:
+                with span("webhook_feedback"):
+                    await self._precompute(event)
+            except Exception as e:
+                logger.error(f"Webhook feedback for call_id={event.call_id} failed: {str(e)}")
+            finally:
+                self.queue.task_done()
+
+    async def _precompute(self, event: CallEndedEvent):
+        if await self.service.get_stored_feedback(event.call_id) is not None:
+            return
+        # A finished job whose result was not stored (it failed, or an early GET found no transcript yet)
+        # must not absorb the transcript this event brings
+        existing = self.service.feedback_jobs.find(event.call_id)
+        if existing and existing.done:
+            self.service.settle_feedback_job(existing)
+        # Running as the call's feedback job lets a GET that arrives meanwhile join it
+        job = await self._follow(event)
+        if event.transcript and self.service.settle_feedback_job(job):
+            # Joined a job that was already polling VAPI and came up empty; use the transcript we have
+            job = await self._follow(event)
+        logger.info(f"Precomputed feedback for call_id={event.call_id}: {job.status}")
+
+    async def _follow(self, event: CallEndedEvent) -> Job:
+        job = self.service.start_feedback_job(event.call_id, event.transcript)
+        async for _ in job.follow(len(job.events)):
+            pass
+        return job
+
+    async def shutdown(self):
+        """Stop the workers; queued events are dropped and fall back to on-demand feedback."""
+        for task in self._workers:
+            task.cancel()
+        if self._workers:
+            await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
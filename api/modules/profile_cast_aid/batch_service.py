@@ -0,0 +1,108 @@
+"""
+Batch candidate screening: many CVs against one set of role requirements.
+
+A batch runs as a background job. Candidates are analyzed concurrently up to
+BATCH_CONFIG["max_concurrency"], sharing a single Tavily lookup, and each
+candidate's result is published to the job as soon as it finishes so clients
+can stream or resume the batch by job id.
+"""
+import asyncio
+import io
+import logging
+import os
+import uuid
+import zipfile
+from typing import AsyncIterator, List, Tuple
+from fastapi import HTTPException, UploadFile
+from constants import BATCH_CONFIG, PDF_CONFIG
+from jobs import Job, JobManager
+from modules.profile_cast_aid.profile_service import ProfileService
+
+logger = logging.getLogger(__name__)
+
+
+class BatchScreeningService:
+    def __init__(self, profile_service: ProfileService):
+        self.profile_service = profile_service
+        self.jobs = JobManager(ttl_seconds=BATCH_CONFIG["job_ttl_seconds"])
+
+    @staticmethod
+    def _check_batch_limits(count: int, total_bytes: int):
+        if count > BATCH_CONFIG["max_candidates"]:
+            raise HTTPException(status_code=413, detail=f"A batch is limited to {BATCH_CONFIG['max_candidates']} candidates.")
+        if total_bytes > BATCH_CONFIG["max_total_bytes"]:
+            raise HTTPException(status_code=413, detail=f"A batch is limited to {BATCH_CONFIG['max_total_bytes']} bytes of PDFs.")
+
+    def _expand_archive(self, filename: str, data: bytes, count: int, total_bytes: int) -> List[Tuple[str, bytes]]:
+        """PDFs in a zip archive; `count` and `total_bytes` are what the batch already holds."""
+        try:
+            archive = zipfile.ZipFile(io.BytesIO(data))
+        except zipfile.BadZipFile:
+            raise HTTPException(status_code=400, detail=f"{filename} is not a valid zip archive.")
+        candidates = []
+        for info in archive.infolist():
+            name = info.filename
+            if info.is_dir() or not name.lower().endswith('.pdf') or name.startswith('__MACOSX/'):
+                continue
+            if info.file_size > PDF_CONFIG["max_bytes"]:
+                raise HTTPException(status_code=413, detail=f"{name} exceeds the {PDF_CONFIG['max_bytes']} byte limit.")
+            # Checked before decompressing, so an oversized archive is rejected without reading it
+            count += 1
+            total_bytes += info.file_size
+            self._check_batch_limits(count, total_bytes)
+            candidates.append((os.path.basename(name), archive.read(info)))
+        return candidates
+
+    async def read_uploads(self, files: List[UploadFile]) -> List[Tuple[str, bytes]]:
+        """Read uploaded PDFs and zip archives of PDFs into (filename, bytes) pairs."""
+        candidates = []
+        total_bytes = 0
+        for file in files:
+            name = file.filename or ""
+            if name.lower().endswith('.zip'):
+                expanded = self._expand_archive(name, await file.read(), len(candidates), total_bytes)
+                candidates.extend(expanded)
+                total_bytes += sum(len(data) for _, data in expanded)
+            elif name.lower().endswith('.pdf'):
+                data = await file.read()
+                candidates.append((name, data))
+                total_bytes += len(data)
+            else:
+                raise HTTPException(status_code=400, detail=f"{name} is not a PDF or zip archive.")
+            self._check_batch_limits(len(candidates), total_bytes)
+        if not candidates:
+            raise HTTPException(status_code=400, detail="No PDF files found in upload.")
+        return candidates
+
+    def start(self, requirements: str, candidates: List[Tuple[str, bytes]]) -> Job:
+        return self.jobs.submit(uuid.uuid4().hex, lambda job: self._run(job, requirements, candidates))
+
+    async def _run(self, job: Job, requirements: str, candidates: List[Tuple[str, bytes]]) -> dict:
+        tavily_context = await self.profile_service.get_tavily_context(requirements)
+        semaphore = asyncio.Semaphore(BATCH_CONFIG["max_concurrency"])
+
+        async def screen(index: int, filename: str, contents: bytes):
+            async with semaphore:
+                try:
+                    result = await self.profile_service.analyze(requirements, contents, tavily_context)
+                    job.publish({"index": index, "filename": filename, "status": "ok", "result": result})
+                except HTTPException as e:
+                    job.publish({"index": index, "filename": filename, "status": "error", "error": e.detail})
+                except Exception as e:
+                    logger.error(f"Batch {job.id}: error screening {filename}: {str(e)}")
+                    job.publish({"index": index, "filename": filename, "status": "error", "error": "Failed to parse profile PDF."})
+
+        await asyncio.gather(*(screen(i, name, data) for i, (name, data) in enumerate(candidates)))
+        failed = sum(1 for event in job.events if event["status"] == "error")
+        return {"total": len(candidates), "succeeded": len(candidates) - failed, "failed": failed}
+
+    @staticmethod
+    def describe(job: Job) -> dict:
+        return {**job.to_dict(), "completed": len(job.events), "candidates": job.events}
+
+    async def stream(self, job: Job, start: int = 0) -> AsyncIterator[Tuple[str, dict]]:
+        """Yield (event, data) pairs: the job id, each candidate as it finishes, then the summary."""
+        yield "job", {"job_id": job.id, "status": job.status}
+        async for event in job.follow(start):
+            yield "candidate", event
+        yield "done", {**job.to_dict(), "completed": len(job.events)}
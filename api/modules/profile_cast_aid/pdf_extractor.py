@@ -0,0 +1,58 @@
+"""
+PDF text extraction for uploaded profiles.
+
+PDFs are parsed from an in-memory buffer in the shared process pool. Large
+documents are split into page ranges that are extracted in parallel.
+"""
+import asyncio
+import io
+import logging
+from typing import List, Optional, Tuple
+from fastapi import HTTPException
+from constants import PDF_CONFIG
+from lazy import lazy_import
+from metrics import span
+import workers
+from workers import run_in_process
+
+logger = logging.getLogger(__name__)
+
+# Only the pool workers that parse PDFs need pdfplumber loaded
+pdfplumber = lazy_import("pdfplumber")
+
+
+def _extract_pages(data: bytes, start: int, end: int) -> Tuple[int, List[str]]:
+    """Extract text from pages [start, end); also returns the document's page count."""
+    with pdfplumber.open(io.BytesIO(data)) as pdf:
+        pages = pdf.pages[start:end]
+        return len(pdf.pages), [page.extract_text() or '' for page in pages]
+
+
+async def _extract(data: bytes) -> str:
+    max_pages = PDF_CONFIG["max_pages"]
+    first_batch = min(PDF_CONFIG["parallel_page_threshold"], max_pages)
+    page_count, texts = await run_in_process(_extract_pages, data, 0, first_batch)
+
+    last_page = min(page_count, max_pages)
+    if page_count > max_pages:
+        logger.warning(f"PDF has {page_count} pages, only the first {max_pages} will be parsed")
+    if last_page > first_batch:
+        step = PDF_CONFIG["pages_per_task"]
+        ranges = [(start, min(start + step, last_page)) for start in range(first_batch, last_page, step)]
+        results = await asyncio.gather(*(run_in_process(_extract_pages, data, start, end) for start, end in ranges))
+        for _, chunk in results:
+            texts.extend(chunk)
+    return "\n".join(texts)
+
+
+async def extract_pdf_text(data: bytes, timeout: Optional[float] = None) -> str:
+    """Extract text from PDF bytes, enforcing the configured size, page and time caps."""
+    if len(data) > PDF_CONFIG["max_bytes"]:
+        raise HTTPException(status_code=413, detail=f"PDF exceeds the {PDF_CONFIG['max_bytes']} byte limit.")
+    try:
+        with span("pdf_extract"):
+            return await asyncio.wait_for(_extract(data), timeout or PDF_CONFIG["timeout_seconds"])
+    except asyncio.TimeoutError:
+        # Cancelling the await leaves the page tasks running; free their pool slots
+        workers.recycle()
+        raise HTTPException(status_code=504, detail="Timed out extracting text from PDF.")
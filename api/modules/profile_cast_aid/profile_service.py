@@ -1,60 +1,65 @@
 """
 Profile service module for handling profile analysis and assistance.
 """
+import json
 import logging
 import traceback
 from fastapi import HTTPException, UploadFile, File, Form
-import requests
-import pdfplumber
+from typing import AsyncIterator, List, Optional, Tuple
+from cache import LRUCache, SingleFlight, cache_key, create_cache, normalize_text
+from chunking import input_budget
+from config import get_endpoint
+from constants import CACHE_CONFIG, RELEVANCE_CONFIG
+from metrics import span
+from http_client import get_http_client
+from modules.profile_cast_aid.pdf_extractor import extract_pdf_text
+from modules.profile_cast_aid.relevance import filter_relevant
 from llm_providers import get_llm_client
 
 logger = logging.getLogger(__name__)
 
+# Bump when the prompt or result shape changes, so cached analyses are regenerated
+PROFILE_RESULT_VERSION = "3"
+# Default for `tavily_context`: look the web context up
+_LOOKUP = object()
+
 class TavilyService:
     def __init__(self, api_key: str):
         self.api_key = api_key
-        self.base_url = "https://api.tavily.com/search"
+        self.base_url = get_endpoint("tavily_search")
+        self.context_cache = LRUCache(**CACHE_CONFIG["tavily_context"])
+        self.inflight = SingleFlight()
+
+    async def get_context(self, requirements: str) -> Optional[str]:
+        """Get web context for a role; cached per normalized requirements, with concurrent lookups shared.
+
+        Returns None when the lookup failed (error, timeout or shed), as opposed to "" for no context.
+        """
+        key = normalize_text(requirements)
+        context = self.context_cache.get(key)
+        if context is not None:
+            return context
+        return await self.inflight.do(key, lambda: self._search(key))
 
-    def get_context(self, query: str) -> str:
+    async def _search(self, requirements: str) -> Optional[str]:
         headers = {"Authorization": f"Bearer {self.api_key}"}
-        params = {"q": query, "num_results": 3}
+        params = {"q": f"Key skills and competencies for: {requirements}", "num_results": 3}
         try:
-            resp = requests.get(self.base_url, headers=headers, params=params, timeout=10)
+            with span("tavily_search"):
+                resp = await get_http_client("tavily").get(self.base_url, headers=headers, params=params)
             if resp.status_code == 200:
                 data = resp.json()
-                return data.get("context", "")
+                context = data.get("context") or ""
+                self.context_cache.set(requirements, context)
+                return context
             else:
-                return ""
+                logger.error(f"Tavily error: HTTP {resp.status_code}")
+                return None
         except Exception as e:
             logger.error(f"Tavily error: {e}")
-            return ""
+            return None
 
-class ProfileService:
-    def __init__(self, tavily_api_key: str = None):
-        self.tavily_service = TavilyService(tavily_api_key) if tavily_api_key else None
-
-    async def parse_profile(self, requirements: str, file: UploadFile):
-        """Parse and analyze a candidate's profile."""
-        try:
-            if not file.filename.lower().endswith('.pdf'):
-                raise HTTPException(status_code=400, detail="Only PDF files are supported.")
-            contents = await file.read()
-            with open("/tmp/profile.pdf", "wb") as f:
-                f.write(contents)
-            with pdfplumber.open("/tmp/profile.pdf") as pdf:
-                text = "\n".join(page.extract_text() or '' for page in pdf.pages)
-            if not text.strip():
-                raise HTTPException(status_code=400, detail="Could not extract text from PDF.")
-            
-            # Get Tavily context if available
-            tavily_context = ""
-            if self.tavily_service:
-                query = f"Key skills and competencies for: {requirements}\n{text[:500]}"
-                tavily_context = self.tavily_service.get_context(query)
-
-            # Generate skills analysis
-            llm = get_llm_client()
-            prompt = f"""
+PROFILE_PROMPT = """
 You are an expert technical recruiter and skills analyst.
 
 ROLE REQUIREMENTS:
@@ -73,11 +78,115 @@ Using ALL the information above, extract a comprehensive, structured list of the
 - For each skill/competency, add a brief explanation or context if possible.
 - Output in clear markdown format.
 """
-            skills = llm.invoke(prompt)
-            if isinstance(skills, dict) and "content" in skills:
-                skills = skills["content"]
-            return {"skills": skills.strip()}
+
+class ProfileService:
+    def __init__(self, tavily_api_key: str = None):
+        self.tavily_service = TavilyService(tavily_api_key) if tavily_api_key else None
+        self.result_cache = create_cache("profile_results")
+
+    @staticmethod
+    async def read_pdf_upload(file: UploadFile) -> bytes:
+        if not file.filename.lower().endswith('.pdf'):
+            raise HTTPException(status_code=400, detail="Only PDF files are supported.")
+        return await file.read()
+
+    @staticmethod
+    def _result_key(contents: bytes, requirements: str, llm) -> str:
+        return cache_key(PROFILE_RESULT_VERSION, contents, normalize_text(requirements),
+                         json.dumps(llm.settings, sort_keys=True))
+
+    async def get_tavily_context(self, requirements: str) -> Optional[str]:
+        # Get Tavily context if available; None if the lookup failed
+        if self.tavily_service:
+            return await self.tavily_service.get_context(requirements)
+        return ""
+
+    async def _build_prompt(self, requirements: str, contents: bytes,
+                            tavily_context=_LOOKUP) -> Tuple[str, List[str], bool]:
+        """Build the analysis prompt.
+
+        Also returns the requirement skills matched locally in the CV, and whether
+        the web context lookup succeeded (results built without it are not cached).
+        """
+        text = await extract_pdf_text(contents)
+        if not text.strip():
+            raise HTTPException(status_code=400, detail="Could not extract text from PDF.")
+        if tavily_context is _LOOKUP:
+            tavily_context = await self.get_tavily_context(requirements)
+        context_ok = tavily_context is not None
+        tavily_context = tavily_context or ""
+        # Only the CV sections relevant to the requirements go to the LLM, sized to fit its input limit
+        max_tokens = input_budget(get_llm_client(), RELEVANCE_CONFIG["max_prompt_tokens"],
+                                  PROFILE_PROMPT.format(requirements=requirements, text="", tavily_context=tavily_context))
+        with span("relevance_filter"):
+            relevance = filter_relevant(text, requirements, max_tokens)
+        prompt = PROFILE_PROMPT.format(requirements=requirements, text=relevance.text, tavily_context=tavily_context)
+        return prompt, relevance.matched_skills, context_ok
+
+    async def analyze(self, requirements: str, contents: bytes, tavily_context=_LOOKUP) -> dict:
+        """Analyze PDF bytes against the role requirements.
+
+        Pass `tavily_context` (a `get_tavily_context` result, None if it failed) to reuse one
+        web lookup across many candidates.
+        """
+        # Repeat analyses of the same CV/requirements/model are served from cache
+        llm = get_llm_client()
+        key = self._result_key(contents, requirements, llm)
+        cached = await self.result_cache.get(key)
+        if cached is not None:
+            logger.info(f"Profile analysis cache hit: {key[:12]}")
+            return cached
+
+        # Generate skills analysis
+        prompt, matched_skills, context_ok = await self._build_prompt(requirements, contents, tavily_context)
+        skills = await llm.ainvoke(prompt)
+        if isinstance(skills, dict) and "content" in skills:
+            skills = skills["content"]
+        result = {"skills": skills.strip(), "matched_skills": matched_skills}
+        # Without its web context the analysis is returned but not cached, so a later request redoes it
+        if context_ok:
+            await self.result_cache.set(key, result)
+        return result
+
+    async def stream_analysis(self, requirements: str, contents: bytes) -> AsyncIterator[Tuple[str, dict]]:
+        """Analyze PDF bytes, yielding (event, data) pairs as LLM tokens arrive."""
+        try:
+            llm = get_llm_client()
+            key = self._result_key(contents, requirements, llm)
+            cached = await self.result_cache.get(key)
+            if cached is not None:
+                yield "result", cached
+                return
+
+            yield "status", {"stage": "extracting"}
+            prompt, matched_skills, context_ok = await self._build_prompt(requirements, contents)
+            yield "status", {"stage": "analyzing", "matched_skills": matched_skills}
+            parts = []
+            async for token in llm.astream(prompt):
+                parts.append(token)
+                yield "token", {"text": token}
+            result = {"skills": "".join(parts).strip(), "matched_skills": matched_skills}
+            if context_ok:
+                await self.result_cache.set(key, result)
+            yield "result", result
+        except HTTPException as e:
+            yield "error", {"status": e.status_code, "detail": e.detail}
+        except Exception as e:
+            logger.error(f"Error streaming profile analysis: {str(e)}")
+            logger.error(f"Traceback: {traceback.format_exc()}")
+            yield "error", {"status": 500, "detail": "Failed to parse profile PDF."}
+
+    async def parse_profile(self, requirements: str, file: UploadFile):
+        """Parse and analyze a candidate's profile."""
+        try:
+            contents = await self.read_pdf_upload(file)
+            return await self.analyze(requirements, contents)
+        except HTTPException as e:
+            if e.status_code != 500:
+                raise
+            logger.error(f"Error parsing profile: {str(e.detail)}")
+            raise HTTPException(status_code=500, detail="Failed to parse profile PDF.")
         except Exception as e:
             logger.error(f"Error parsing profile: {str(e)}")
             logger.error(f"Traceback: {traceback.format_exc()}")
-            raise HTTPException(status_code=500, detail="Failed to parse profile PDF.") 
\ No newline at end of file
+            raise HTTPException(status_code=500, detail="Failed to parse profile PDF.")
@@ -0,0 +1,214 @@
+"""
+Local relevance pre-filter for CV text.
+
+The CV is split into sections (experience, skills, education, ...) on its
+headings, and long sections (and long lines) into blocks. A keyword/phrase index built from
+the role requirements scores every block at once with BM25 over a
+(blocks x keywords) count matrix. The CV's opening block and its summary and
+skills sections are always kept; then the best-scoring blocks, then the rest in document order,
+up to a token budget, go into the LLM prompt in their original order. Lexical
+matching misses synonyms (Postgres/PostgreSQL, k8s), so the score only ranks
+blocks and never drops them outright. The requirement keywords found
+anywhere in the CV are returned as `matched_skills`.
+"""
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+from chunking import estimate_tokens, split_long_line
+from constants import RELEVANCE_CONFIG
+from lazy import lazy_import
+
+logger = logging.getLogger(__name__)
+
+np = lazy_import("numpy")
+
+# Keeps tech tokens like c++, c#, node.js and front-end whole
+_TOKEN = re.compile(r"[a-z0-9][a-z0-9+#.-]*[a-z0-9+#]|[a-z0-9]", re.IGNORECASE)
+# Requirements are split into clauses so phrases never span list items
+_CLAUSE = re.compile(r"[,;:()\n•|]+|\band\b|\bor\b", re.IGNORECASE)
+
+STOPWORDS = frozenset("""
+a an the and or of for to in on at by with from as is are be been being this that these those it its
+we you our your their they will would should must can could may might do does did have has had not
+no nor but if so such than then there here who whom which what when where why how all any both each
+few more most other some own same very just also into over under about above below up down out off
+again further once per via etc e.g i.e plus including include includes using use used within across
+experience experienced years year strong solid good great excellent proven demonstrated knowledge
+ability able skills skill understanding familiarity familiar working work works hands-on background
+candidate role position team teams looking seeking required requirements preferred nice ideal
+senior junior mid level lead leads leading responsible responsibilities minimum least one two three
+know knows knowing engineer engineers developer developers specialist specialists professional
+professionals individual someone person people join joining help helps need needs want wants like
+well new based related relevant bonus
+""".split())
+
+SECTION_KINDS = {
+    "summary": ("summary", "profile", "about", "objective", "overview"),
+    "experience": ("experience", "employment", "work history", "career", "professional background"),
+    "skills": ("skills", "technologies", "competencies", "tools", "expertise"),
+    "education": ("education", "academic", "qualifications", "degrees"),
+    "projects": ("projects", "portfolio", "publications"),
+    "certifications": ("certifications", "certificates", "licenses", "courses", "training", "awards"),
+}
+MAX_HEADING_CHARS = 40
+# Sections kept whatever their score: the header anchors the CV, summary and skills list the candidate's stack
+PINNED_KINDS = ("header", "summary", "skills")
+
+
+@dataclass
+class Block:
+    section: str
+    kind: str
+    lines: List[str] = field(default_factory=list)
+    tokens: int = 0
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.lines)
+
+
+@dataclass
+class RelevanceResult:
+    text: str
+    matched_skills: List[str]
+    kept_blocks: int
+    total_blocks: int
+
+
+def tokenize(text: str) -> List[str]:
+    return [token.lower() for token in _TOKEN.findall(text)]
+
+
+def _heading_kind(line: str) -> str:
+    """Return the section kind if `line` looks like a CV heading, else ''."""
+    stripped = line.strip().rstrip(":").strip()
+    if not stripped or len(stripped) > MAX_HEADING_CHARS or len(stripped.split()) > 4:
+        return ""
+    lowered = stripped.lower()
+    for kind, words in SECTION_KINDS.items():
+        if any(lowered.startswith(word) or lowered.endswith(word) for word in words):
+            return kind
+    # Other all-caps short lines (e.g. "VOLUNTEERING") are headings too
+    return "other" if stripped.isupper() and any(ch.isalpha() for ch in stripped) else ""
+
+
+def section_cv(text: str, max_block_tokens: int) -> List[Block]:
+    """Split CV text into blocks of at most `max_block_tokens`, each tagged with its section."""
+    blocks: List[Block] = []
+    current = Block(section="", kind="header")
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        kind = _heading_kind(line)
+        if kind:
+            if current.lines:
+                blocks.append(current)
+            current = Block(section=line.strip().rstrip(":"), kind=kind)
+            continue
+        # A long line (e.g. a PDF without line breaks) would otherwise become one block too big to keep
+        for piece in split_long_line(line, max_block_tokens):
+            tokens = estimate_tokens(piece)
+            if current.lines and current.tokens + tokens > max_block_tokens:
+                blocks.append(current)
+                current = Block(section=current.section, kind=current.kind)
+            current.lines.append(piece)
+            current.tokens += tokens
+    if current.lines:
+        blocks.append(current)
+    return blocks
+
+
+def build_keyword_index(requirements: str) -> Dict[Tuple[str, ...], Tuple[str, float]]:
+    """Map keyword token tuples (terms and two-word phrases) to (display form, weight)."""
+    index: Dict[Tuple[str, ...], Tuple[str, float]] = {}
+    for clause in _CLAUSE.split(requirements):
+        words = [word for word in _TOKEN.findall(clause or "") if word.lower() not in STOPWORDS and len(word) > 1]
+        for word in words:
+            index.setdefault((word.lower(),), (word, 1.0))
+        for first, second in zip(words, words[1:]):
+            key = (first.lower(), second.lower())
+            index.setdefault(key, (f"{first} {second}", RELEVANCE_CONFIG["phrase_weight"]))
+    return index
+
+
+def _count_matrix(blocks: List[Block], keywords: List[Tuple[str, ...]]) -> Tuple["np.ndarray", "np.ndarray"]:
+    """Keyword occurrence counts per block, plus each block's length in tokens."""
+    column = {keyword: i for i, keyword in enumerate(keywords)}
+    rows, cols, lengths = [], [], []
+    for row, block in enumerate(blocks):
+        tokens = tokenize(block.text)
+        lengths.append(len(tokens))
+        for i, token in enumerate(tokens):
+            col = column.get((token,))
+            if col is not None:
+                rows.append(row)
+                cols.append(col)
+            if i + 1 < len(tokens):
+                col = column.get((token, tokens[i + 1]))
+                if col is not None:
+                    rows.append(row)
+                    cols.append(col)
+    counts = np.zeros((len(blocks), len(keywords)), dtype=np.float64)
+    np.add.at(counts, (np.asarray(rows, dtype=np.intp), np.asarray(cols, dtype=np.intp)), 1.0)
+    return counts, np.asarray(lengths, dtype=np.float64)
+
+
+def score_blocks(counts: "np.ndarray", lengths: "np.ndarray", weights: "np.ndarray") -> "np.ndarray":
+    """BM25 score of every block against the keyword index."""
+    k1, b = RELEVANCE_CONFIG["bm25_k1"], RELEVANCE_CONFIG["bm25_b"]
+    n_blocks = counts.shape[0]
+    doc_freq = (counts > 0).sum(axis=0)
+    idf = np.log1p((n_blocks - doc_freq + 0.5) / (doc_freq + 0.5))
+    norm = k1 * (1 - b + b * lengths / max(lengths.mean(), 1.0))
+    tf = counts * (k1 + 1) / (counts + norm[:, None])
+    return tf @ (idf * weights)
+
+
+def filter_relevant(text: str, requirements: str, max_tokens: int = None) -> RelevanceResult:
+    """Keep the CV blocks most relevant to `requirements`, up to `max_tokens`."""
+    max_tokens = max_tokens or RELEVANCE_CONFIG["max_prompt_tokens"]
+    # Blocks stay well under a small budget, so some of them always fit
+    blocks = section_cv(text, min(RELEVANCE_CONFIG["max_block_tokens"], max(max_tokens // 4, 1)))
+    index = build_keyword_index(requirements)
+    if not blocks or not index:
+        return RelevanceResult(text, [], len(blocks), len(blocks))
+
+    keywords = list(index)
+    counts, lengths = _count_matrix(blocks, keywords)
+    found = counts.sum(axis=0) > 0
+    matched_phrases = {word for keyword, hit in zip(keywords, found) if hit and len(keyword) > 1 for word in keyword}
+    # A matched phrase stands in for its own words
+    matched_skills = [
+        index[keyword][0] for keyword, hit in zip(keywords, found)
+        if hit and (len(keyword) > 1 or keyword[0] not in matched_phrases)
+    ]
+
+    total_tokens = sum(block.tokens for block in blocks)
+    if total_tokens <= max_tokens:
+        return RelevanceResult(text, matched_skills, len(blocks), len(blocks))
+
+    scores = score_blocks(counts, lengths, np.asarray([index[keyword][1] for keyword in keywords]))
+    keep = set()
+    budget = max_tokens
+    # Only the first header block is pinned: a CV without headings is all "header"
+    pinned = [i for i, block in enumerate(blocks) if block.kind in PINNED_KINDS and (block.kind != "header" or i == 0)]
+    ranked = [int(i) for i in np.argsort(-scores, kind="stable") if scores[i] > 0]
+    # Blocks with no lexical match still fill the budget, in document order
+    for i in pinned + ranked + list(range(len(blocks))):
+        if i not in keep and blocks[i].tokens <= budget:
+            keep.add(i)
+            budget -= blocks[i].tokens
+
+    parts, section = [], None
+    for i, block in enumerate(blocks):
+        if i not in keep:
+            continue
+        if block.section and block.section != section:
+            parts.append(f"\n{block.section.upper()}")
+        section = block.section
+        parts.append(block.text)
+    parts.append("\n(Other CV sections were omitted as not relevant to the role requirements.)")
+    logger.info(f"Relevance filter kept {len(keep)}/{len(blocks)} CV blocks "
+                f"({max_tokens - budget}/{total_tokens} tokens)")
+    return RelevanceResult("\n".join(parts).strip(), matched_skills, len(keep), len(blocks))
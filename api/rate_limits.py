@@ -0,0 +1,284 @@
+"""
+Cross-worker rate limiting and upstream admission control.
+
+Both live in one SQLite file under CACHE_DIR, so every uvicorn worker on the
+host shares the same counters:
+
+- `SQLiteStorage` is a `limits` storage backend (scheme `sqlite://`) for the
+  slowapi per-client limits, which otherwise count per process. slowapi
+  calls its storage synchronously on the event loop, so hits are counted in
+  memory and a background thread merges them into the shared file every
+  `sync_interval_seconds`; other workers' hits show up within that lag.
+- `UpstreamLimiter` keeps a token bucket per upstream (VAPI, Tavily, OpenAI).
+  A call reserves a token before it is sent. If the next token is a short wait
+  away the call queues for it; if the wait exceeds the upstream's
+  `max_queue_seconds` the call is shed with 503 and `Retry-After`. A 429 from
+  an upstream pauses its bucket for the upstream's Retry-After.
+"""
+import asyncio
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+import urllib.parse
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+from fastapi import HTTPException
+from limits.storage import Storage
+from cache import CACHE_DIR
+from constants import RATE_LIMIT_STORAGE_CONFIG, UPSTREAM_RATE_LIMITS
+from metrics import span, upstream_shed
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_DB = os.path.join(CACHE_DIR, "rate_limits.sqlite")
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    # Autocommit mode; write transactions are opened explicitly with BEGIN IMMEDIATE
+    conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+@dataclass
+class _Counter:
+    value: int
+    expires_at: float
+    # Hits not yet merged into the shared file
+    pending: int = 0
+
+
+class SQLiteStorage(Storage):
+    """Fixed-window counters for slowapi, shared by all workers through SQLite."""
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri: Optional[str] = None, **options):
+        parsed = urllib.parse.urlparse(uri or "")
+        self.path = parsed.netloc + parsed.path or RATE_LIMIT_DB
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.conn = _connect(self.path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS counters (key TEXT PRIMARY KEY, value INTEGER NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS counters_expires ON counters (expires_at)")
+        # Serializes use of the connection; `self.lock` only guards the in-memory counters
+        self._db_lock = threading.Lock()
+        self.counters: Dict[str, _Counter] = {}
+        self.sync_interval = RATE_LIMIT_STORAGE_CONFIG["sync_interval_seconds"]
+        self._purged_at = 0.0
+        super().__init__(uri, **options)
+        self._syncer = threading.Thread(target=self._sync_loop, name="rate-limit-sync", daemon=True)
+        self._syncer.start()
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def incr(self, key, expiry, elastic_expiry=False, amount=1):
+        now = time.time()
+        with self.lock:
+            counter = self.counters.get(key)
+            if counter is None or counter.expires_at <= now:
+                counter = self.counters[key] = _Counter(0, now + expiry)
+            counter.value += amount
+            counter.pending += amount
+            if elastic_expiry:
+                counter.expires_at = now + expiry
+            return counter.value
+
+    def get(self, key):
+        with self.lock:
+            counter = self.counters.get(key)
+            return counter.value if counter and counter.expires_at > time.time() else 0
+
+    def get_expiry(self, key):
+        with self.lock:
+            counter = self.counters.get(key)
+            return int(counter.expires_at) if counter else int(time.time())
+
+    def check(self):
+        try:
+            with self._db_lock:
+                self.conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+        with self._db_lock:
+            self.conn.execute("DELETE FROM counters")
+
+    def clear(self, key):
+        with self.lock:
+            self.counters.pop(key, None)
+        with self._db_lock:
+            self.conn.execute("DELETE FROM counters WHERE key = ?", (key,))
+
+    def _sync_loop(self):
+        while True:
+            time.sleep(self.sync_interval)
+            try:
+                self.sync()
+            except sqlite3.Error as e:
+                # Counts stay local until the shared file is reachable again
+                logger.warning(f"Rate limit sync failed: {e}")
+
+    def sync(self):
+        """Merge local hits into the shared counters and adopt the merged totals."""
+        now = time.time()
+        with self.lock:
+            # Expired windows with nothing left to merge are dropped
+            for key in [key for key, c in self.counters.items() if c.expires_at <= now and not c.pending]:
+                del self.counters[key]
+            snapshot = {key: (c.pending, c.expires_at) for key, c in self.counters.items()}
+            for counter in self.counters.values():
+                counter.pending = 0
+        purge = now - self._purged_at >= RATE_LIMIT_STORAGE_CONFIG["purge_interval_seconds"]
+        if not snapshot and not purge:
+            return
+        merged = {}
+        with self._db_lock:
+            try:
+                self.conn.execute("BEGIN IMMEDIATE")
+                for key, (pending, expires_at) in snapshot.items():
+                    row = self.conn.execute("SELECT value, expires_at FROM counters WHERE key = ?", (key,)).fetchone()
+                    if row is None or row[1] <= now:
+                        row = (0, expires_at)
+                    merged[key] = (row[0] + pending, row[1])
+                    if pending:
+                        self.conn.execute(
+                            "INSERT OR REPLACE INTO counters (key, value, expires_at) VALUES (?, ?, ?)", (key, *merged[key])
+                        )
+                if purge:
+                    # Expired windows of every worker are purged here
+                    self.conn.execute("DELETE FROM counters WHERE expires_at <= ?", (now,))
+                    self._purged_at = now
+                self.conn.execute("COMMIT")
+            except BaseException:
+                if self.conn.in_transaction:
+                    self.conn.execute("ROLLBACK")
+                with self.lock:
+                    # Put the hits back so the next sync merges them
+                    for key, (pending, expires_at) in snapshot.items():
+                        counter = self.counters.get(key)
+                        if counter and counter.expires_at == expires_at:
+                            counter.pending += pending
+                raise
+        with self.lock:
+            for key, (value, expires_at) in merged.items():
+                counter = self.counters.get(key)
+                # Skip windows that rolled over locally while the merge ran
+                if counter and counter.expires_at == snapshot[key][1]:
+                    counter.value = value + counter.pending
+                    counter.expires_at = expires_at
+
+
+class UpstreamLimiter:
+    def __init__(self, path: str = RATE_LIMIT_DB):
+        self.path = path
+        self.enabled = os.getenv("UPSTREAM_RATE_LIMIT_ENABLED", "true").lower() != "false"
+        # One connection per thread: calls run in asyncio.to_thread's pool, and connections cannot be shared
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            "upstream TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL, blocked_until REAL NOT NULL)"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = _connect(self.path)
+        return conn
+
+    def _reserve(self, upstream: str) -> Tuple[bool, float]:
+        """Take a token, possibly ahead of time; returns (admitted, seconds until it is ours)."""
+        settings = UPSTREAM_RATE_LIMITS[upstream]
+        rate, burst = settings["rate_per_second"], settings["burst"]
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute(
+                "SELECT tokens, updated_at, blocked_until FROM buckets WHERE upstream = ?", (upstream,)
+            ).fetchone()
+            tokens, updated_at, blocked_until = row if row else (burst, now, 0.0)
+            tokens = min(burst, tokens + (now - updated_at) * rate)
+            # Tokens go negative as calls queue up; each one waits for its own refill slot
+            wait = max(blocked_until - now, (1 - tokens) / rate if tokens < 1 else 0.0)
+            if wait > settings["max_queue_seconds"]:
+                conn.execute("ROLLBACK")
+                return False, wait
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (upstream, tokens, updated_at, blocked_until) VALUES (?, ?, ?, ?)",
+                (upstream, tokens - 1, now, blocked_until),
+            )
+            conn.execute("COMMIT")
+            return True, wait
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+    def _block(self, upstream: str, seconds: float):
+        now = time.time()
+        self._conn().execute(
+            "INSERT INTO buckets (upstream, tokens, updated_at, blocked_until) VALUES (?, 0, ?, ?) "
+            "ON CONFLICT (upstream) DO UPDATE SET blocked_until = MAX(blocked_until, excluded.blocked_until)",
+            (upstream, now, now + seconds),
+        )
+
+    async def acquire(self, upstream: str):
+        """Wait for the upstream's next call slot, or raise 503 with Retry-After when the queue is too long."""
+        if not self.enabled or upstream not in UPSTREAM_RATE_LIMITS:
+            return
+        try:
+            admitted, wait = await asyncio.to_thread(self._reserve, upstream)
+        except sqlite3.Error as e:
+            # Fail open: a broken limiter must not take the upstream down with it
+            logger.warning(f"Upstream limiter unavailable for {upstream}: {e}")
+            return
+        if not admitted:
+            upstream_shed.inc(upstream=upstream)
+            logger.warning(f"Shedding {upstream} call: next slot is {wait:.1f}s away")
+            raise HTTPException(
+                status_code=503, detail=f"{upstream} is busy, please retry shortly.",
+                headers={"Retry-After": str(math.ceil(wait))},
+            )
+        if wait > 0:
+            with span(f"{upstream}_rate_wait"):
+                await asyncio.sleep(wait)
+
+    async def backoff(self, upstream: str, retry_after: Optional[str]):
+        """Pause an upstream's bucket for every worker after it answered 429."""
+        if not self.enabled or upstream not in UPSTREAM_RATE_LIMITS:
+            return
+        try:
+            seconds = float(retry_after) if retry_after else UPSTREAM_RATE_LIMITS[upstream]["default_backoff_seconds"]
+        except ValueError:
+            seconds = UPSTREAM_RATE_LIMITS[upstream]["default_backoff_seconds"]
+        try:
+            await asyncio.to_thread(self._block, upstream, seconds)
+        except sqlite3.Error as e:
+            logger.warning(f"Upstream limiter unavailable for {upstream}: {e}")
+
+
+_upstream_limiter: Optional[UpstreamLimiter] = None
+
+
+def get_upstream_limiter() -> UpstreamLimiter:
+    global _upstream_limiter
+    if _upstream_limiter is None:
+        _upstream_limiter = UpstreamLimiter()
+    return _upstream_limiter
+
+
+def storage_uri() -> str:
+    """Storage for the per-client limits: RATE_LIMIT_STORAGE_URI (e.g. redis://) or the shared SQLite file."""
+    return os.getenv("RATE_LIMIT_STORAGE_URI") or f"sqlite://{RATE_LIMIT_DB}"
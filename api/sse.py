@@ -0,0 +1,26 @@
+"""
+Server-sent event helpers for the streaming endpoints.
+"""
+import json
+from typing import AsyncIterator, Tuple
+from fastapi.responses import StreamingResponse
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    # Stop reverse proxies from buffering the stream
+    "X-Accel-Buffering": "no",
+}
+
+
+def format_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _encode(events: AsyncIterator[Tuple[str, dict]]) -> AsyncIterator[str]:
+    async for event, data in events:
+        yield format_event(event, data)
+
+
+def sse_response(events: AsyncIterator[Tuple[str, dict]]) -> StreamingResponse:
+    """Stream (event, data) pairs as a text/event-stream response."""
+    return StreamingResponse(_encode(events), media_type="text/event-stream", headers=SSE_HEADERS)
@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+# Modules import each other by top-level name, as when the API runs from api/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Keep caches and rate-limit files written during tests out of the real cache directory
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="profile-cast-tests-"))
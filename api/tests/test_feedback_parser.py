@@ -0,0 +1,115 @@
+import json
+
+import pytest
+
+from modules.ai_castingfit.feedback_parser import IncrementalJSONParser, normalize_feedback, parse_feedback
+
+FEEDBACK = {
+    "role": "Backend \"Lead\" \\ Engineer",
+    "skills": {"must": [{"name": "Python", "status": "good"}, {"name": "Café ops", "status": "ok"}]},
+    "summary": {"take": "Solid.\nHire.", "strong": ["APIs"], "ok": [], "weak": ["k8s"]},
+    "score": -1.5,
+    "remote": True,
+    "notes": None,
+}
+# \u escapes and backslash escapes, so chunk boundaries fall inside them
+RAW = json.dumps(FEEDBACK, ensure_ascii=True)
+
+
+def feed_chunks(text: str, size: int) -> IncrementalJSONParser:
+    parser = IncrementalJSONParser()
+    for i in range(0, len(text), size):
+        parser.feed(text[i:i + size])
+    return parser
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7, 64])
+def test_chunk_sizes(size):
+    parser = feed_chunks(RAW, size)
+    assert parser.done
+    assert parser.snapshot() == FEEDBACK
+
+
+def test_every_split_point():
+    for cut in range(1, len(RAW)):
+        parser = IncrementalJSONParser()
+        parser.feed(RAW[:cut])
+        parser.feed(RAW[cut:])
+        assert parser.snapshot() == FEEDBACK, f"split at {cut}: {RAW[:cut]!r}"
+
+
+def test_split_inside_escapes():
+    parser = IncrementalJSONParser()
+    for chunk in ['{"role": "a\\', '"b\\', '\\c\\u00', 'e9"}']:
+        parser.feed(chunk)
+    assert parser.snapshot() == {"role": 'a"b\\cé'}
+
+
+def test_fenced_json_with_prose():
+    text = "Sure! Here is the feedback:\n```json\n" + RAW + "\n```\nLet me know if {you} need more."
+    parser = feed_chunks(text, 4)
+    assert parser.done
+    assert parser.snapshot() == FEEDBACK
+
+
+def test_truncated_output_keeps_partial_values():
+    parser = IncrementalJSONParser()
+    parser.feed('{"role": "Dev", "skills": {"must": [{"name": "Pyth')
+    assert not parser.done
+    assert parser.snapshot() == {"role": "Dev", "skills": {"must": [{"name": "Pyth"}]}}
+    parser.feed('on"}], "sh')
+    # A key still being written is left out
+    assert parser.snapshot() == {"role": "Dev", "skills": {"must": [{"name": "Python"}]}}
+
+
+def test_completed_counts_values():
+    parser = IncrementalJSONParser()
+    parser.feed('{"a": 1, "b": [tr')
+    before = parser.completed
+    parser.feed('ue]')
+    assert parser.completed == before + 2
+    assert parser.snapshot() == {"a": 1, "b": [True]}
+
+
+def test_normalize_feedback_fills_schema():
+    feedback = normalize_feedback({
+        "role": "Dev",
+        "skills": {"must": ["Python", {"name": "SQL", "status": "Excellent"}, {"status": "good"}, " "], "could": "Go"},
+        "summary": {"take": None, "strong": "APIs"},
+    })
+    assert feedback["skills"] == {
+        "must": [{"name": "Python", "status": "neutral"}, {"name": "SQL", "status": "neutral"}],
+        "should": [],
+        "could": [{"name": "Go", "status": "neutral"}],
+    }
+    assert feedback["summary"] == {"take": "", "strong": ["APIs"], "ok": [], "weak": []}
+
+
+def test_normalize_feedback_rejects_other_objects():
+    assert normalize_feedback({"answer": 42}) is None
+    assert normalize_feedback(["role"]) is None
+
+
+def test_parse_feedback_falls_back_to_plain_text():
+    assert parse_feedback("The candidate did well.") == {
+        "feedback_summary": "The candidate did well.",
+        "feedback_fallback": "The candidate did well.",
+        "format": "plain",
+    }
+
+
+def test_parse_feedback_drops_truncated_value():
+    feedback = parse_feedback('```json\n{"role": "Dev", "summary": {"take": "Goo')
+    assert feedback["role"] == "Dev"
+    assert feedback["summary"]["take"] == ""
+    assert feedback["format"] == "truncated"
+
+
+def test_parse_feedback_drops_truncated_skill():
+    feedback = parse_feedback('{"role":"Dev","skills":{"must":[{"name":"Python","status":"good"},{"name":"Dj')
+    assert feedback["skills"]["must"] == [{"name": "Python", "status": "good"}]
+    assert feedback["format"] == "truncated"
+
+
+def test_parse_feedback_complete_object_is_not_truncated():
+    assert "format" not in parse_feedback(RAW)
@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import rate_limits
+from rate_limits import SQLiteStorage, UpstreamLimiter
+
+SETTINGS = {"rate_per_second": 10, "burst": 3, "max_queue_seconds": 0.25, "default_backoff_seconds": 2}
+
+
+@pytest.fixture
+def limiter(tmp_path, monkeypatch):
+    monkeypatch.setitem(rate_limits.UPSTREAM_RATE_LIMITS, "test", SETTINGS)
+    monkeypatch.setenv("UPSTREAM_RATE_LIMIT_ENABLED", "true")
+    return UpstreamLimiter(str(tmp_path / "buckets.sqlite"))
+
+
+@pytest.fixture
+def frozen_time(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limits.time, "time", lambda: now[0])
+    return now
+
+
+def test_burst_then_queued_slots(limiter, frozen_time):
+    assert [limiter._reserve("test") for _ in range(3)] == [(True, 0.0)] * 3
+    # Each queued call waits for its own refill slot at 10 tokens/s
+    admitted, wait = limiter._reserve("test")
+    assert admitted and wait == pytest.approx(0.1)
+    admitted, wait = limiter._reserve("test")
+    assert admitted and wait == pytest.approx(0.2)
+    # The next slot is beyond max_queue_seconds, so the call is shed
+    admitted, wait = limiter._reserve("test")
+    assert not admitted and wait == pytest.approx(0.3)
+
+
+def test_tokens_refill_up_to_burst(limiter, frozen_time):
+    for _ in range(3):
+        limiter._reserve("test")
+    frozen_time[0] += 60
+    assert [limiter._reserve("test")[1] for _ in range(3)] == [0.0] * 3
+    assert limiter._reserve("test")[1] == pytest.approx(0.1)
+
+
+def test_backoff_blocks_every_caller(limiter, frozen_time):
+    asyncio.run(limiter.backoff("test", "0.2"))
+    admitted, wait = limiter._reserve("test")
+    assert admitted and wait == pytest.approx(0.2)
+    asyncio.run(limiter.backoff("test", None))
+    assert limiter._reserve("test") == (False, pytest.approx(2.0))
+
+
+def test_acquire_sheds_with_retry_after(limiter, frozen_time):
+    asyncio.run(limiter.backoff("test", "5"))
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(limiter.acquire("test"))
+    assert exc.value.status_code == 503
+    assert exc.value.headers["Retry-After"] == "5"
+
+
+def test_unknown_upstream_is_not_limited(limiter):
+    asyncio.run(limiter.acquire("unconfigured"))
+
+
+def test_storage_merges_hits_across_workers(tmp_path):
+    uri = f"sqlite://{tmp_path}/counters.sqlite"
+    first, second = SQLiteStorage(uri), SQLiteStorage(uri)
+    for _ in range(4):
+        first.incr("client", 60)
+    assert second.incr("client", 60) == 1
+    first.sync()
+    second.sync()
+    first.sync()
+    assert first.get("client") == second.get("client") == 5
+    assert first.get_expiry("client") == second.get_expiry("client")
+
+
+def test_storage_windows_expire(tmp_path, frozen_time):
+    storage = SQLiteStorage(f"sqlite://{tmp_path}/counters.sqlite")
+    storage.incr("client", 10)
+    storage.sync()
+    frozen_time[0] += 11
+    assert storage.get("client") == 0
+    assert storage.incr("client", 10) == 1
+    storage._purged_at = 0
+    storage.sync()
+    rows = storage.conn.execute("SELECT key, value FROM counters").fetchall()
+    assert rows == [("client", 1)]
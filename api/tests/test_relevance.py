@@ -0,0 +1,70 @@
+from modules.profile_cast_aid.relevance import filter_relevant, section_cv
+
+CV = "\n".join([
+    "Jane Doe",
+    "Senior Software Engineer | jane@example.com",
+    "SUMMARY",
+    "Backend engineer building payment APIs for ten years.",
+    "EXPERIENCE",
+    *[f"Acme {i}: built services in Python and FastAPI on Kubernetes, tuned PostgreSQL queries." for i in range(40)],
+    "SKILLS",
+    "Python, FastAPI, Postgres, k8s, golang, AWS",
+    "EDUCATION",
+    *[f"Course {i}: distributed systems and databases." for i in range(20)],
+])
+
+
+def test_short_cv_is_kept_whole():
+    result = filter_relevant(CV, "Python developer", max_tokens=100_000)
+    assert result.text == CV
+    assert result.kept_blocks == result.total_blocks
+
+
+def test_sections_are_detected():
+    kinds = {block.kind for block in section_cv(CV, 50)}
+    assert kinds == {"header", "summary", "experience", "skills", "education"}
+
+
+def test_relevant_blocks_fill_the_budget():
+    result = filter_relevant(CV, "Python, FastAPI and Kubernetes", max_tokens=300)
+    assert "Acme" in result.text
+    assert "SKILLS" in result.text and "golang" in result.text
+    assert result.kept_blocks < result.total_blocks
+    assert result.text.endswith("(Other CV sections were omitted as not relevant to the role requirements.)")
+
+
+def test_no_lexical_match_still_keeps_skills_and_content():
+    result = filter_relevant(CV, "Marketing manager with SEO", max_tokens=700)
+    assert result.matched_skills == []
+    assert "Jane Doe" in result.text
+    assert "Postgres, k8s, golang" in result.text
+    # The rest of the budget is filled in document order, not left empty
+    assert "Acme 0" in result.text
+
+
+def test_matched_skills_skip_filler_words():
+    result = filter_relevant(CV, "Engineer who knows Python and AWS", max_tokens=300)
+    assert result.matched_skills == ["Python", "AWS"]
+
+
+def test_matched_phrase_stands_in_for_its_words():
+    result = filter_relevant(CV, "distributed systems", max_tokens=300)
+    assert result.matched_skills == ["distributed systems"]
+
+
+def test_long_line_is_split_into_blocks():
+    text = "Jane Doe " + "Built Python services on AWS with Kafka. " * 800
+    blocks = section_cv(text, 300)
+    assert len(blocks) > 1
+    assert all(block.tokens <= 300 for block in blocks)
+    result = filter_relevant(text, "Python AWS Kafka", max_tokens=2500)
+    assert result.text.startswith("Jane Doe Built Python services")
+    assert 0 < result.kept_blocks < result.total_blocks
+
+
+def test_cv_without_headings_is_ranked():
+    lines = [f"Job {i}: managed retail store staff." for i in range(150)] + ["Job 150: built Kafka pipelines."]
+    result = filter_relevant("\n".join(lines), "Kafka", max_tokens=200)
+    # Only the opening block is pinned; the rest compete on relevance
+    assert "Job 0:" in result.text
+    assert "Kafka pipelines" in result.text
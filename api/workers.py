@@ -0,0 +1,95 @@
+"""
+Shared process pool for CPU-heavy work (PDF parsing and similar).
+
+Work submitted here runs outside the event loop and spreads across cores.
+Where the platform cannot create worker processes (e.g. serverless runtimes
+without /dev/shm), a thread pool is used instead.
+
+A worker process that dies (a crash, or the OOM killer) breaks the whole
+pool; the next task replaces the pool and retries once. Callers that give up
+on a runaway task call `recycle()` so it does not keep holding a slot.
+"""
+import asyncio
+import importlib
+import logging
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Iterable, Optional
+from constants import WORKER_CONFIG
+
+logger = logging.getLogger(__name__)
+
+_pool: Optional[Executor] = None
+
+
+def get_process_pool() -> Executor:
+    global _pool
+    if _pool is None:
+        size = WORKER_CONFIG["process_pool_size"]
+        try:
+            _pool = ProcessPoolExecutor(max_workers=size, mp_context=multiprocessing.get_context("spawn"))
+        except (OSError, NotImplementedError) as e:
+            logger.warning(f"Process pool unavailable ({e}), falling back to threads")
+            _pool = ThreadPoolExecutor(max_workers=size)
+    return _pool
+
+
+def _discard(pool: Executor):
+    """Stop using `pool`; a replacement is created on the next task."""
+    global _pool
+    if _pool is pool:
+        _pool = None
+        pool.shutdown(wait=False)
+
+
+async def run_in_process(func: Callable, *args) -> Any:
+    """Run a picklable, module-level function in the shared pool."""
+    loop = asyncio.get_running_loop()
+    for attempt in range(2):
+        pool = get_process_pool()
+        try:
+            return await loop.run_in_executor(pool, func, *args)
+        except BrokenProcessPool as e:
+            _discard(pool)
+            if attempt:
+                raise
+            logger.warning(f"Process pool broken ({e}), restarting it and retrying {func.__name__}")
+
+
+def recycle():
+    """Kill the pool's worker processes, e.g. after a task timed out, and start afresh on the next task.
+
+    Other tasks running in the pool fail with BrokenProcessPool and are retried by `run_in_process`.
+    Threads cannot be killed, so a thread pool is left to finish its work.
+    """
+    pool = _pool
+    if not isinstance(pool, ProcessPoolExecutor):
+        return
+    logger.warning("Recycling the process pool")
+    # ProcessPoolExecutor has no public way to stop running work before Python 3.14
+    for process in list((pool._processes or {}).values()):
+        process.kill()
+    _discard(pool)
+
+
+def _import_modules(names: Iterable[str]):
+    for name in names:
+        importlib.import_module(name)
+
+
+async def warm_up(modules: Iterable[str] = ()):
+    """Start the pool's workers and import `modules` in them ahead of the first real task."""
+    names = tuple(modules)
+    pool = get_process_pool()
+    # A thread pool shares this process's imports, so one task is enough
+    count = pool._max_workers if isinstance(pool, ProcessPoolExecutor) else 1
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*(loop.run_in_executor(pool, _import_modules, names) for _ in range(count)))
+
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,128 @@
+"""
+Deterministic sample inputs for benchmarks: CV PDFs, call transcripts and
+audio clips of varying size.
+
+Run `python corpus.py --out corpus/` to write the corpus to disk; the
+benchmark harness and fake upstreams import the generators directly.
+"""
+import argparse
+import io
+import json
+import math
+import os
+import random
+import struct
+import wave
+from typing import Dict, List
+
+PDF_SIZES = {"small": 1, "medium": 5, "large": 30}
+TRANSCRIPT_SIZES = {"short": 10, "medium": 60, "long": 300}
+
+SKILLS = [
+    "Python", "FastAPI", "Django", "PostgreSQL", "Redis", "Kubernetes", "Docker", "AWS", "GCP",
+    "Terraform", "React", "TypeScript", "Next.js", "GraphQL", "Kafka", "Spark", "Airflow",
+    "machine learning", "PyTorch", "data modelling", "CI/CD", "observability", "team leadership",
+    "stakeholder management", "system design", "REST APIs", "microservices", "SQL", "Go", "Rust",
+]
+ROLES = ["Software Engineer", "Senior Backend Engineer", "Data Engineer", "Tech Lead", "Platform Engineer"]
+COMPANIES = ["Acme Corp", "Globex", "Initech", "Umbrella", "Hooli", "Stark Industries", "Wayne Enterprises"]
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(pages: List[List[str]]) -> bytes:
+    """Build a minimal text-only PDF, one list of lines per page."""
+    count = len(pages)
+    font_id = 3 + 2 * count
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{' '.join(f'{3 + 2 * i} 0 R' for i in range(count))}] /Count {count} >>",
+    ]
+    for i, lines in enumerate(pages):
+        content = "BT /F1 10 Tf 50 770 Td 13 TL " + " ".join(f"({_pdf_escape(line)}) Tj T*" for line in lines) + " ET"
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {4 + 2 * i} 0 R >>"
+        )
+        objects.append(f"<< /Length {len(content)} >>\nstream\n{content}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1"))
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    for offset in offsets:
+        out.write(f"{offset:010d} 00000 n \n".encode())
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+    return out.getvalue()
+
+
+def sample_cv(pages: int, seed: int = 0) -> bytes:
+    rng = random.Random(seed)
+    lines_per_page = 50
+    lines = [f"Candidate {seed}", "SUMMARY", f"{rng.choice(ROLES)} with {rng.randint(2, 15)} years of experience.", "SKILLS",
+             ", ".join(rng.sample(SKILLS, 10)), "EXPERIENCE"]
+    while len(lines) < pages * lines_per_page - 4:
+        lines.append(f"{rng.choice(ROLES)} at {rng.choice(COMPANIES)} ({rng.randint(2008, 2023)} - present)")
+        for _ in range(rng.randint(3, 6)):
+            a, b = rng.sample(SKILLS, 2)
+            lines.append(f"- Built and operated services using {a} and {b}, improving latency by {rng.randint(5, 60)}%.")
+    lines.extend(["EDUCATION", f"BSc Computer Science, University {rng.randint(1, 50)}"])
+    return make_pdf([lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)][:pages])
+
+
+def sample_transcript(turns: int, seed: int = 0) -> List[Dict[str, str]]:
+    rng = random.Random(seed)
+    messages = []
+    for i in range(turns):
+        if i % 2 == 0:
+            text = f"Can you tell me about your experience with {rng.choice(SKILLS)}?"
+            messages.append({"role": "assistant", "message": text})
+        else:
+            a, b = rng.sample(SKILLS, 2)
+            text = (f"At {rng.choice(COMPANIES)} I used {a} heavily, mostly together with {b}. "
+                    f"I led a project that cut costs by {rng.randint(5, 40)}% and mentored {rng.randint(1, 6)} engineers.")
+            messages.append({"role": "user", "message": text})
+    return messages
+
+
+def sample_wav(seconds: float = 3.0, sample_rate: int = 48000, channels: int = 2) -> bytes:
+    """A sine tone as 16-bit PCM WAV, shaped like typical browser recordings."""
+    frames = int(seconds * sample_rate)
+    out = io.BytesIO()
+    with wave.open(out, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        samples = bytearray()
+        for n in range(frames):
+            value = int(12000 * math.sin(2 * math.pi * 440 * n / sample_rate))
+            samples += struct.pack("<h", value) * channels
+        wav.writeframes(bytes(samples))
+    return out.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write the benchmark corpus to disk.")
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(__file__), "corpus"))
+    args = parser.parse_args()
+    os.makedirs(args.out, exist_ok=True)
+    for name, pages in PDF_SIZES.items():
+        with open(os.path.join(args.out, f"cv_{name}.pdf"), "wb") as f:
+            f.write(sample_cv(pages))
+    for name, turns in TRANSCRIPT_SIZES.items():
+        with open(os.path.join(args.out, f"transcript_{name}.json"), "w") as f:
+            json.dump(sample_transcript(turns), f, indent=2)
+    with open(os.path.join(args.out, "speech.wav"), "wb") as f:
+        f.write(sample_wav())
+    print(f"Corpus written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
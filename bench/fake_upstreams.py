@@ -0,0 +1,164 @@
+"""
+Local stand-ins for VAPI, Tavily and OpenAI, for offline benchmarks.
+
+Each vendor is mounted under its own prefix (/vapi, /tavily, /openai/v1) and
+answers with payloads shaped like the real API. Latency, jitter, error rate
+and payload size are tunable globally or per vendor through environment
+variables, e.g. FAKE_LATENCY_MS=50 FAKE_OPENAI_LATENCY_MS=800
+FAKE_TAVILY_ERROR_RATE=0.05. Run with:
+
+    python fake_upstreams.py --port 9100
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import time
+import zlib
+from typing import Dict
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from corpus import SKILLS, TRANSCRIPT_SIZES, sample_transcript
+
+VENDORS = ("vapi", "tavily", "openai")
+DEFAULTS = {
+    "latency_ms": 50.0,
+    "jitter_ms": 10.0,
+    "error_rate": 0.0,
+    "payload_scale": 1.0,
+}
+
+
+def _vendor_settings(vendor: str) -> Dict[str, float]:
+    settings = {}
+    for name, default in DEFAULTS.items():
+        env_name = name.upper()
+        value = os.getenv(f"FAKE_{vendor.upper()}_{env_name}") or os.getenv(f"FAKE_{env_name}") or default
+        settings[name] = float(value)
+    return settings
+
+
+SETTINGS = {vendor: _vendor_settings(vendor) for vendor in VENDORS}
+# Polls of a call that report it in-progress before it ends
+IN_PROGRESS_POLLS = int(os.getenv("FAKE_IN_PROGRESS_POLLS", 0))
+TRANSCRIPT_SIZE = os.getenv("FAKE_TRANSCRIPT_SIZE", "medium")
+TOKEN_DELAY_MS = float(os.getenv("FAKE_OPENAI_TOKEN_DELAY_MS", 5))
+
+app = FastAPI(title="Profile Cast fake upstreams")
+_call_polls: Dict[str, int] = {}
+
+
+async def _simulate(vendor: str):
+    """Sleep for the vendor's latency and maybe fail, like a flaky upstream."""
+    settings = SETTINGS[vendor]
+    delay = max(0.0, random.gauss(settings["latency_ms"], settings["jitter_ms"])) / 1000
+    await asyncio.sleep(delay)
+    if random.random() < settings["error_rate"]:
+        raise HTTPException(status_code=random.choice([429, 500, 503]), detail=f"Simulated {vendor} error")
+
+
+def _scaled(vendor: str, n: int) -> int:
+    return max(1, int(n * SETTINGS[vendor]["payload_scale"]))
+
+
+@app.post("/vapi/v1/speech-to-text")
+async def vapi_speech_to_text(request: Request):
+    body = await request.body()
+    await _simulate("vapi")
+    return {"text": f"I have worked with {random.choice(SKILLS)} for several years. ({len(body)} bytes received)"}
+
+
+@app.post("/vapi/v1/text-to-speech")
+async def vapi_text_to_speech(request: Request):
+    payload = await request.json()
+    await _simulate("vapi")
+    audio = os.urandom(_scaled("vapi", 16 * len(payload.get("text", "")) + 2048))
+    return {"audio": base64.b64encode(audio).decode()}
+
+
+@app.get("/vapi/call")
+async def vapi_call(id: str):
+    await _simulate("vapi")
+    polls = _call_polls[id] = _call_polls.get(id, 0) + 1
+    if polls <= IN_PROGRESS_POLLS:
+        return [{"id": id, "status": "in-progress", "messages": []}]
+    turns = _scaled("vapi", TRANSCRIPT_SIZES.get(TRANSCRIPT_SIZE, 60))
+    return [{"id": id, "status": "ended", "messages": sample_transcript(turns, seed=zlib.crc32(id.encode()) % 1000)}]
+
+
+@app.get("/tavily/search")
+async def tavily_search(q: str = ""):
+    await _simulate("tavily")
+    sentences = [f"{skill} is frequently listed for roles like '{q[:60]}'." for skill in random.sample(SKILLS, 8)]
+    return {"context": " ".join(sentences * _scaled("tavily", 1))}
+
+
+def _completion_text(prompt: str) -> str:
+    if "JSON object" in prompt:
+        skills = random.sample(SKILLS, 9)
+        return json.dumps({
+            "role": "Software Engineer",
+            "skills": {
+                tier: [{"name": name, "status": random.choice(["good", "ok", "weak", "neutral"])} for name in skills[i * 3:i * 3 + 3]]
+                for i, tier in enumerate(("must", "should", "could"))
+            },
+            "summary": {"take": "Solid candidate with relevant experience.", "strong": skills[:2], "ok": skills[2:3], "weak": skills[3:4]},
+        })
+    lines = []
+    for section in ("MUST HAVE", "SHOULD HAVE", "COULD HAVE", "OTHER RELEVANT SKILLS/EXPERIENCE"):
+        lines.append(f"## {section}")
+        lines.extend(f"- **{skill}**: demonstrated in recent roles." for skill in random.sample(SKILLS, 4))
+    return "\n".join(lines * _scaled("openai", 1))
+
+
+def _tokens(text: str):
+    # Roughly 4 characters per token, like real completions
+    return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+
+@app.post("/openai/v1/chat/completions")
+async def openai_chat_completions(request: Request):
+    payload = await request.json()
+    await _simulate("openai")
+    prompt = "\n".join(message.get("content", "") for message in payload.get("messages", []))
+    text = _completion_text(prompt)
+    model = payload.get("model", "gpt-4")
+    created = int(time.time())
+
+    if not payload.get("stream"):
+        return JSONResponse({
+            "id": "chatcmpl-fake", "object": "chat.completion", "created": created, "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(text) // 4, "total_tokens": (len(prompt) + len(text)) // 4},
+        })
+
+    async def events():
+        for token in _tokens(text):
+            await asyncio.sleep(TOKEN_DELAY_MS / 1000)
+            chunk = {
+                "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/health")
+async def health():
+    return {"status": "healthy", "settings": SETTINGS}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run the fake VAPI/Tavily/OpenAI upstreams.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,290 @@
+"""
+Load-test harness for the Profile Cast API.
+
+Drives the API endpoints at a target concurrency for a fixed duration and
+reports requests/second, p50/p95/p99 latency and error counts per scenario,
+plus the server's event-loop lag (from /api/metrics).
+
+With --spawn the harness starts the fake upstreams and the API itself, wired
+together through the upstream URL environment variables, so it runs fully
+offline:
+
+    python run_bench.py --spawn --concurrency 32 --duration 20
+    python run_bench.py --base-url http://localhost:5000 --scenarios parse_profile,health
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from corpus import PDF_SIZES, sample_cv, sample_wav
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+API_DIR = os.path.join(HERE, "..", "api")
+REQUIREMENTS = "Senior backend engineer: Python, FastAPI, PostgreSQL, Kubernetes and AWS; leads small teams."
+
+
+class Scenario:
+    def __init__(self, name: str, run: Callable[[httpx.AsyncClient, int], Awaitable[None]]):
+        self.name = name
+        self.run = run
+        self.latencies: List[float] = []
+        self.errors = 0
+
+
+async def _check(response: httpx.Response):
+    if response.status_code >= 400:
+        raise RuntimeError(f"HTTP {response.status_code}: {response.text[:200]}")
+
+
+def build_scenarios(unique: bool) -> Dict[str, Scenario]:
+    cvs = {name: sample_cv(pages, seed=i) for i, (name, pages) in enumerate(PDF_SIZES.items())}
+    cv_cycle = itertools.cycle(cvs.items())
+    wav = sample_wav()
+    batch_cvs = [sample_cv(1, seed=k) for k in range(10)]
+
+    def requirements(i: int) -> str:
+        # Unique requirements defeat the result cache, so every request does the full pipeline
+        return f"{REQUIREMENTS} (run {uuid.uuid4().hex[:8]})" if unique else REQUIREMENTS
+
+    async def parse_profile(client, i):
+        name, pdf = next(cv_cycle)
+        r = await client.post("/api/parse-profile", data={"requirements": requirements(i)},
+                              files={"file": (f"cv_{name}.pdf", pdf, "application/pdf")})
+        await _check(r)
+
+    async def parse_profile_stream(client, i):
+        name, pdf = next(cv_cycle)
+        async with client.stream("POST", "/api/parse-profile/stream", data={"requirements": requirements(i)},
+                                 files={"file": (f"cv_{name}.pdf", pdf, "application/pdf")}) as r:
+            await _check(r)
+            async for _ in r.aiter_bytes():
+                pass
+
+    async def batch(client, i):
+        files = [("files", (f"batch_cv_{k}.pdf", pdf, "application/pdf")) for k, pdf in enumerate(batch_cvs)]
+        async with client.stream("POST", "/api/parse-profile/batch", data={"requirements": requirements(i)}, files=files) as r:
+            await _check(r)
+            async for _ in r.aiter_bytes():
+                pass
+
+    async def speech_to_text(client, i):
+        r = await client.post("/api/speech-to-text", files={"file": ("speech.wav", wav, "audio/wav")})
+        await _check(r)
+
+    async def text_to_speech(client, i):
+        r = await client.post("/api/text-to-speech", json={"text": f"Question {i % 5 + 1}: tell me about a project you led."})
+        await _check(r)
+
+    async def call_feedback(client, i):
+        call_id = f"bench-{uuid.uuid4().hex}"
+        while True:
+            r = await client.get("/api/call-feedback", params={"call_id": call_id})
+            await _check(r)
+            if r.status_code != 202:
+                return
+            await asyncio.sleep(0.2)
+
+    async def call_feedback_stream(client, i):
+        async with client.stream("GET", "/api/call-feedback/stream", params={"call_id": f"bench-{uuid.uuid4().hex}"}) as r:
+            await _check(r)
+            async for _ in r.aiter_bytes():
+                pass
+
+    async def health(client, i):
+        await _check(await client.get("/api/health"))
+
+    scenarios = [parse_profile, parse_profile_stream, batch, speech_to_text, text_to_speech,
+                 call_feedback, call_feedback_stream, health]
+    return {fn.__name__: Scenario(fn.__name__, fn) for fn in scenarios}
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(pct / 100 * len(values))) - 1))
+    return values[index]
+
+
+async def _scrape_lag(client: httpx.AsyncClient) -> Optional[Dict[str, float]]:
+    """Cumulative event-loop lag histogram buckets from the server's /api/metrics."""
+    try:
+        r = await client.get("/api/metrics")
+    except httpx.HTTPError:
+        return None
+    if r.status_code != 200:
+        return None
+    buckets = {}
+    for match in re.finditer(r'profilecast_event_loop_lag_seconds_bucket\{le="([^"]+)"\} (\S+)', r.text):
+        buckets[match.group(1)] = float(match.group(2))
+    return buckets
+
+
+def _lag_summary(before: Optional[Dict[str, float]], after: Optional[Dict[str, float]]) -> Optional[Dict[str, float]]:
+    if not before or not after:
+        return None
+    deltas = [(float("inf") if le == "+Inf" else float(le), after[le] - before.get(le, 0)) for le in after]
+    deltas.sort()
+    total = deltas[-1][1]
+    if total <= 0:
+        return None
+
+    def upper_bound(pct: float) -> float:
+        for bound, count in deltas:
+            if count >= pct / 100 * total:
+                return bound
+        return float("inf")
+
+    return {"samples": total, "p50_le_s": upper_bound(50), "p99_le_s": upper_bound(99)}
+
+
+async def run(base_url: str, scenario_names: List[str], concurrency: int, duration: float, unique: bool) -> dict:
+    scenarios = build_scenarios(unique)
+    selected = [scenarios[name] for name in scenario_names]
+    limits = httpx.Limits(max_connections=concurrency * 2, max_keepalive_connections=concurrency * 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        lag_before = await _scrape_lag(client)
+        counter = itertools.count()
+        deadline = time.perf_counter() + duration
+        started = time.perf_counter()
+
+        async def worker():
+            while time.perf_counter() < deadline:
+                i = next(counter)
+                scenario = selected[i % len(selected)]
+                start = time.perf_counter()
+                try:
+                    await scenario.run(client, i)
+                    scenario.latencies.append(time.perf_counter() - start)
+                except Exception:
+                    scenario.errors += 1
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        lag_after = await _scrape_lag(client)
+
+    report = {"base_url": base_url, "concurrency": concurrency, "duration_s": elapsed, "scenarios": {},
+              "event_loop_lag": _lag_summary(lag_before, lag_after)}
+    for scenario in selected:
+        report["scenarios"][scenario.name] = {
+            "requests": len(scenario.latencies),
+            "errors": scenario.errors,
+            "rps": len(scenario.latencies) / elapsed,
+            "p50_ms": _percentile(scenario.latencies, 50) * 1000,
+            "p95_ms": _percentile(scenario.latencies, 95) * 1000,
+            "p99_ms": _percentile(scenario.latencies, 99) * 1000,
+        }
+    return report
+
+
+def print_report(report: dict):
+    print(f"\n{report['base_url']}  concurrency={report['concurrency']}  duration={report['duration_s']:.1f}s")
+    print(f"{'scenario':<22}{'reqs':>7}{'errs':>6}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, stats in report["scenarios"].items():
+        print(f"{name:<22}{stats['requests']:>7}{stats['errors']:>6}{stats['rps']:>9.1f}"
+              f"{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}")
+    lag = report["event_loop_lag"]
+    if lag:
+        print(f"event-loop lag: p50 <= {lag['p50_le_s'] * 1000:g} ms, p99 <= {lag['p99_le_s'] * 1000:g} ms "
+              f"({int(lag['samples'])} samples)")
+
+
+def _wait_until_up(url: str, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def spawn_stack(api_port: int, fake_port: int, workers: int) -> List[subprocess.Popen]:
+    """Start the fake upstreams and the API wired to them; returns the processes to stop."""
+    fake_url = f"http://127.0.0.1:{fake_port}"
+    fake = subprocess.Popen([sys.executable, "fake_upstreams.py", "--port", str(fake_port)], cwd=HERE)
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "bench", "TAVILY_API_KEY": "bench", "VAPI_BE_API_KEY": "bench",
+        "OPENAI_BASE_URL": f"{fake_url}/openai/v1",
+        "TAVILY_SEARCH_URL": f"{fake_url}/tavily/search",
+        "VAPI_SPEECH_TO_TEXT_URL": f"{fake_url}/vapi/v1/speech-to-text",
+        "VAPI_TEXT_TO_SPEECH_URL": f"{fake_url}/vapi/v1/text-to-speech",
+        "VAPI_CALL_FEEDBACK_URL": f"{fake_url}/vapi/call",
+        "CACHE_DIR": tempfile.mkdtemp(prefix="profile-cast-bench-"),
+        "RATE_LIMIT_ENABLED": "false",
+        "UPSTREAM_RATE_LIMIT_ENABLED": "false",
+    }
+    api = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "index:app", "--port", str(api_port), "--workers", str(workers),
+         "--log-level", "warning"],
+        cwd=API_DIR, env=env, stdout=subprocess.DEVNULL,
+    )
+    processes = [fake, api]
+    try:
+        _wait_until_up(f"{fake_url}/health")
+        # Ready, not just healthy: measurements should not include the workers' background warm-up
+        _wait_until_up(f"http://127.0.0.1:{api_port}/api/ready")
+    except Exception:
+        stop(processes)
+        raise
+    return processes
+
+
+def stop(processes: List[subprocess.Popen]):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main():
+    default_scenarios = "parse_profile,parse_profile_stream,speech_to_text,text_to_speech,call_feedback,health"
+    parser = argparse.ArgumentParser(description="Benchmark the Profile Cast API.")
+    parser.add_argument("--base-url", default="http://127.0.0.1:5000")
+    parser.add_argument("--scenarios", default=default_scenarios,
+                        help="Comma-separated scenarios, or 'all'")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=15, help="Seconds to run")
+    parser.add_argument("--unique", action="store_true", help="Defeat result caches with unique requirements")
+    parser.add_argument("--spawn", action="store_true", help="Start fake upstreams and the API locally")
+    parser.add_argument("--api-port", type=int, default=5055)
+    parser.add_argument("--fake-port", type=int, default=9100)
+    parser.add_argument("--workers", type=int, default=1, help="API worker processes when spawning")
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    names = list(build_scenarios(False)) if args.scenarios == "all" else args.scenarios.split(",")
+    processes = []
+    base_url = args.base_url
+    if args.spawn:
+        processes = spawn_stack(args.api_port, args.fake_port, args.workers)
+        base_url = f"http://127.0.0.1:{args.api_port}"
+    try:
+        report = asyncio.run(run(base_url, names, args.concurrency, args.duration, args.unique))
+    finally:
+        stop(processes)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Cold-start budget check for the Profile Cast API.
+
+Measures, in fresh processes, how long `import index` takes (median of
+several runs, via `python -X importtime`) and how long a uvicorn worker
+takes to answer /api/health and then /api/ready. Exits non-zero when a
+measurement is over its budget, and lists the slowest imports so a new
+eager dependency is easy to spot:
+
+    python startup_budget.py
+    python startup_budget.py --import-budget-ms 1000 --ready-budget-ms 4000 --runs 7
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from run_bench import API_DIR, stop
+
+
+def _env() -> Dict[str, str]:
+    # Placeholder keys so the LLM client is built during warm-up; nothing calls the upstreams
+    return {
+        **os.environ,
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "budget"),
+        "CACHE_DIR": tempfile.mkdtemp(prefix="profile-cast-startup-"),
+        "LOG_LEVEL": "WARNING",
+    }
+
+
+def _parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """(module, depth, cumulative microseconds) for each line of -X importtime output."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((name.strip(), depth, int(cumulative)))
+    return entries
+
+
+def measure_import(runs: int) -> Tuple[float, List[Tuple[str, int]]]:
+    """Median `import index` time in ms, and the slowest direct imports of the median run."""
+    results = []
+    env = _env()
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import index"],
+                              cwd=API_DIR, env=env, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(f"import index failed:\n{proc.stderr[-2000:]}")
+        entries = _parse_importtime(proc.stderr)
+        total = next(cumulative for name, depth, cumulative in entries if name == "index" and depth == 0)
+        results.append((total, entries))
+    results.sort(key=lambda result: result[0])
+    total, entries = results[len(results) // 2]
+    # Direct imports of index (depth 1) plus anything imported before it (e.g. by site)
+    slowest = sorted(((name, cumulative) for name, depth, cumulative in entries if depth <= 1 and name != "index"),
+                     key=lambda item: -item[1])
+    return total / 1000, [(name, cumulative // 1000) for name, cumulative in slowest]
+
+
+def _wait_for(client: httpx.Client, url: str, started: float, timeout: float) -> Optional[float]:
+    while time.perf_counter() - started < timeout:
+        try:
+            if client.get(url, timeout=1).status_code == 200:
+                return (time.perf_counter() - started) * 1000
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.02)
+    return None
+
+
+def measure_ready(port: int, timeout: float) -> Tuple[Optional[float], Optional[float]]:
+    """Milliseconds from launching uvicorn until /api/health, then /api/ready, answer 200."""
+    started = time.perf_counter()
+    api = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "index:app", "--port", str(port), "--log-level", "warning"],
+        cwd=API_DIR, env=_env(), stdout=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}") as client:
+            healthy = _wait_for(client, "/api/health", started, timeout)
+            ready = _wait_for(client, "/api/ready", started, timeout) if healthy is not None else None
+    finally:
+        stop([api])
+    return healthy, ready
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the API's cold-start time against a budget.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh-process import measurements to take")
+    parser.add_argument("--import-budget-ms", type=float, default=1500)
+    parser.add_argument("--ready-budget-ms", type=float, default=6000)
+    parser.add_argument("--port", type=int, default=5066)
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds to wait for the worker")
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to list")
+    args = parser.parse_args()
+
+    import_ms, slowest = measure_import(args.runs)
+    healthy_ms, ready_ms = measure_ready(args.port, args.timeout)
+
+    print(f"import index      {import_ms:8.0f} ms  (median of {args.runs}, budget {args.import_budget_ms:g} ms)")
+    print(f"first /api/health {healthy_ms:8.0f} ms" if healthy_ms is not None else "first /api/health   timed out")
+    print(f"first /api/ready  {ready_ms:8.0f} ms  (budget {args.ready_budget_ms:g} ms)"
+          if ready_ms is not None else "first /api/ready    timed out")
+    print("\nslowest imports (cumulative ms):")
+    for name, ms in slowest[:args.top]:
+        print(f"  {ms:6d}  {name}")
+
+    failures = []
+    if import_ms > args.import_budget_ms:
+        failures.append(f"import took {import_ms:.0f} ms, budget is {args.import_budget_ms:g} ms")
+    if ready_ms is None or ready_ms > args.ready_budget_ms:
+        failures.append(f"worker was not ready within {args.ready_budget_ms:g} ms")
+    for failure in failures:
+        print(f"OVER BUDGET: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
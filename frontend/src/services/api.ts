@@ -30,6 +30,8 @@ export interface FeedbackResponse {
   feedback_fallback?: string;
   format?: string;
   processing?: boolean;
+  job_id?: string;
+  status?: string;
 }
 
 // --- API Service Class ---
@@ -87,7 +89,10 @@ class ApiService {
       }
 
       const data = await response.json();
-      this.setCachedData(cacheKey, data);
+      // 202 means the feedback job is still running; only cache finished feedback
+      if (response.status !== 202) {
+        this.setCachedData(cacheKey, data);
+      }
       return data;
     } catch (error) {
       console.error('Error fetching feedback:', error);
@@ -95,7 +100,7 @@ class ApiService {
     }
   }
 
-  async parseProfile(requirements: string, file: File): Promise<{ skills: string }> {
+  async parseProfile(requirements: string, file: File): Promise<{ skills: string; matched_skills?: string[] }> {
     const formData = new FormData();
     formData.append('requirements', requirements);
     formData.append('file', file);